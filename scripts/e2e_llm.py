@@ -0,0 +1,203 @@
+"""
+LLM side of the E2E smoke test: prompt, OpenRouter calls, answer parsing.
+"""
+
+import json
+import logging
+import time
+from collections.abc import Callable
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from llm_json import (
+    is_action,
+    iter_json_values,
+    json_dumps,
+    json_loads,
+    read_sse_content,
+)
+
+log = logging.getLogger("e2e_smoke")
+
+OPENROUTER_URL = "https://openrouter.ai/api/v1/chat/completions"
+# Per-attempt timeout, a little above typical latency for a batched answer,
+# so a stalled request is retried instead of waited out.
+DEFAULT_LLM_TIMEOUT = 30.0
+# Approximate prompt budget for the conversation history (system prompt
+# included). Older exchanges are dropped once it is exceeded.
+MAX_HISTORY_TOKENS = 6000
+
+SYSTEM_PROMPT = """\
+You are playing Megacity, a 256x256 grid city builder.
+Each message contains one or more turn observations, each introduced by an
+"=== Turn N ===" marker and given as compact JSON:
+  t: tick, $: treasury, in/ex: monthly income/expenses, pop: population,
+  hap: happiness (0-100), pw/wt: power/water coverage (0-1),
+  d: zone demand [residential, commercial, industrial, office],
+  w: warnings (omitted when none)
+Respond with building actions for every turn.
+
+Available actions:
+- {"PlaceRoadLine": {"start": [x,y], "end": [x,y], "road_type": "Avenue"}}
+- {"ZoneRect": {"min": [x,y], "max": [x,y], "zone_type": "ResidentialLow"}}
+- {"PlaceUtility": {"pos": [x,y], "utility_type": "PowerPlant"}}
+- {"PlaceUtility": {"pos": [x,y], "utility_type": "WaterTower"}}
+- {"PlaceService": {"pos": [x,y], "service_type": "FireStation"}}
+
+Strategy: Build an avenue, place PowerPlant and WaterTower near it, \
+zone residential and commercial along it.
+
+Respond with ONLY a JSON object holding one action array per turn, in the
+same order as the observations. Example for two turns:
+{"turns": [[{"PlaceRoadLine": {"start": [120,128], "end": [140,128], "road_type": "Avenue"}}, \
+{"PlaceUtility": {"pos": [118,128], "utility_type": "PowerPlant"}}], \
+[{"ZoneRect": {"min": [120,129], "max": [140,130], "zone_type": "ResidentialLow"}}]]}
+"""
+
+
+# One keep-alive session for the whole run so the TCP+TLS handshake to
+# OpenRouter is paid once rather than on every turn.
+SESSION = requests.Session()
+SESSION.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=4))
+
+
+def call_llm(
+    api_key: str, model: str, messages: list[dict], max_tokens: int = 2048,
+    timeout: float = DEFAULT_LLM_TIMEOUT,
+    on_delta: Callable[[str], None] | None = None,
+) -> str:
+    """Call OpenRouter API and return the assistant content string.
+
+    Each attempt is bounded by *timeout* seconds. A timed-out first attempt
+    is retried immediately (a tail-latency outlier, not an overloaded
+    server); other failures back off exponentially.
+
+    With *on_delta* the response is streamed over SSE and every content
+    chunk is passed to it as it arrives. A stream that fails after chunks
+    were delivered is not retried, since the caller may already have acted
+    on them.
+    """
+    headers = {
+        "Authorization": f"Bearer {api_key}",
+        "Content-Type": "application/json",
+        "HTTP-Referer": "https://github.com/dzautner/megacity",
+        "X-Title": "Megacity E2E Smoke Test",
+    }
+    payload = {
+        "model": model,
+        "messages": messages,
+        "temperature": 0.7,
+        "max_tokens": max_tokens,
+    }
+    if on_delta is not None:
+        payload["stream"] = True
+    delivered: list[str] = []
+    for attempt in range(3):
+        try:
+            resp = SESSION.post(
+                OPENROUTER_URL, headers=headers, data=json_dumps(payload),
+                timeout=timeout, stream=on_delta is not None,
+            )
+            resp.raise_for_status()
+            if on_delta is None:
+                return json_loads(resp.content)["choices"][0]["message"]["content"]
+            return read_sse_content(resp, on_delta, delivered)
+        except requests.Timeout as exc:
+            if delivered:
+                raise
+            log.warning("LLM API attempt %d timed out: %s", attempt + 1, exc)
+            if 0 < attempt < 2:
+                time.sleep(2 ** attempt)
+        except (requests.RequestException, KeyError, json.JSONDecodeError) as exc:
+            if delivered:
+                raise
+            log.warning("LLM API attempt %d failed: %s", attempt + 1, exc)
+            if attempt < 2:
+                time.sleep(2 ** attempt)
+    raise RuntimeError("OpenRouter API failed after 3 attempts")
+
+
+def _is_action_list(value) -> bool:
+    return isinstance(value, list) and bool(value) and all(map(is_action, value))
+
+
+def parse_llm_actions(content: str) -> list[dict]:
+    """Parse the LLM response into a list of action dicts.
+
+    Handles: raw JSON arrays, markdown-fenced JSON, JSON embedded in prose.
+    Only an ``"actions"`` member or a list of action objects is accepted,
+    so a bracketed fragment in prose (e.g. ``[120,128]``) is never taken
+    for the action list.
+    """
+    for value in iter_json_values(content, nested=True):
+        if isinstance(value, dict) and isinstance(value.get("actions"), list):
+            return value["actions"]
+        if _is_action_list(value):
+            return value
+
+    log.warning("Could not parse LLM response as actions: %s", content.strip()[:200])
+    return []
+
+
+def parse_llm_turns(content: str) -> list[list[dict]]:
+    """Parse a batched LLM response into one action list per turn.
+
+    Expects ``{"turns": [[...], [...]]}``, but also accepts a bare list of
+    action lists, or a single flat action list (treated as one turn).
+    """
+    for value in iter_json_values(content, nested=True):
+        if isinstance(value, dict) and isinstance(value.get("turns"), list):
+            return [t if isinstance(t, list) else [] for t in value["turns"]]
+        if (
+            isinstance(value, list) and value
+            and all(t == [] or _is_action_list(t) for t in value)
+        ):
+            return value
+
+    return [parse_llm_actions(content)]
+
+
+def format_observation(obs: dict) -> str:
+    """Format a city observation as a compact one-line JSON summary.
+
+    The keys are documented in SYSTEM_PROMPT; short keys and rounded values
+    keep each turn's block to a few dozen tokens.
+    """
+    zd = obs.get("zone_demand", {})
+    summary = {
+        "t": obs.get("tick"),
+        "$": round(obs.get("treasury", 0)),
+        "in": round(obs.get("monthly_income", 0)),
+        "ex": round(obs.get("monthly_expenses", 0)),
+        "pop": obs.get("population", {}).get("total", 0),
+        "hap": round(obs.get("happiness", {}).get("overall", 0), 1),
+        "pw": round(obs.get("power_coverage", 0), 2),
+        "wt": round(obs.get("water_coverage", 0), 2),
+        "d": [
+            round(zd.get(k, 0))
+            for k in ("residential", "commercial", "industrial", "office")
+        ],
+    }
+    warnings = obs.get("warnings", [])
+    if warnings:
+        summary["w"] = warnings[:3]
+    return json_dumps(summary).decode()
+
+
+def _approx_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token)."""
+    return len(text) // 4
+
+
+def trim_history(conversation: list[dict]):
+    """Drop the oldest exchanges until the prompt fits MAX_HISTORY_TOKENS.
+
+    The system prompt and the newest user message are always kept, and the
+    history never starts with an orphaned assistant reply.
+    """
+    total = sum(_approx_tokens(m["content"]) for m in conversation)
+    while len(conversation) > 2 and (
+        total >= MAX_HISTORY_TOKENS or conversation[1]["role"] == "assistant"
+    ):
+        total -= _approx_tokens(conversation.pop(1)["content"])
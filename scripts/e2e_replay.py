@@ -0,0 +1,160 @@
+"""
+Replay validation for the E2E smoke test.
+
+Checks the structure of a saved replay (top-level keys, entry count and
+any declared entry_count) without keeping the parsed entries around.
+"""
+
+import json
+import mmap
+from dataclasses import dataclass, field
+from pathlib import Path
+
+try:
+    import orjson  # optional: parses replays straight from a memory map
+except ImportError:
+    orjson = None
+
+try:
+    import ijson  # optional: stream-validates large replays
+    _IJSON_ERRORS = ijson.JSONError
+except ImportError:
+    ijson = None
+    _IJSON_ERRORS = ()
+
+
+@dataclass
+class ReplayShape:
+    """The few structural facts about a replay that validation checks."""
+
+    top_type: str = "dict"
+    keys: set = field(default_factory=set)
+    entries_is_list: bool = True
+    entry_count: int = 0
+    # entry_count values declared in footer / header / top level, if any
+    declared: dict = field(default_factory=dict)
+
+
+_JSON_EVENT_TYPES = {
+    "start_map": "dict",
+    "start_array": "list",
+    "string": "str",
+    "boolean": "bool",
+    "null": "NoneType",
+}
+
+
+def _stream_replay_shape(f) -> ReplayShape:
+    """Walk the replay as a stream of ijson events, keeping O(1) state.
+
+    Entries are counted as they go by instead of being materialized.
+    """
+    shape = ReplayShape()
+    seen_top = False
+    seen_entries = False
+    for prefix, event, value in ijson.parse(f, buf_size=1 << 20, use_float=True):
+        if prefix == "":
+            if not seen_top:
+                seen_top = True
+                shape.top_type = _JSON_EVENT_TYPES.get(event, type(value).__name__)
+            elif event == "map_key":
+                shape.keys.add(value)
+        elif prefix == "entries":
+            if not seen_entries:
+                seen_entries = True
+                shape.entries_is_list = event == "start_array"
+        elif prefix == "entries.item":
+            if shape.entries_is_list and event not in ("map_key", "end_map", "end_array"):
+                shape.entry_count += 1
+        elif prefix in ("footer.entry_count", "header.entry_count", "entry_count"):
+            shape.declared[prefix.split(".")[0]] = value
+    return shape
+
+
+def _orjson_load_mmap(f):
+    """Parse an open binary file with orjson straight from a read-only mmap.
+
+    Avoids reading the file into a bytes object first, so peak memory is
+    the parsed document plus the page cache.
+    """
+    with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm, \
+            memoryview(mm) as view:
+        return orjson.loads(view)
+
+
+def _replay_shape_from_data(data) -> ReplayShape:
+    """Build a :class:`ReplayShape` from an already-parsed replay."""
+    if not isinstance(data, dict):
+        return ReplayShape(top_type=type(data).__name__)
+    entries = data.get("entries", [])
+    shape = ReplayShape(
+        keys=set(data.keys()),
+        entries_is_list=isinstance(entries, list),
+        entry_count=len(entries) if isinstance(entries, list) else 0,
+    )
+    for section in ("footer", "header"):
+        if "entry_count" in data.get(section, {}):
+            shape.declared[section] = data[section]["entry_count"]
+    if "entry_count" in data:
+        shape.declared["entry_count"] = data["entry_count"]
+    return shape
+
+
+def validate_replay(path: str) -> tuple[bool, int, list[str]]:
+    """Validate the replay file at *path*.
+
+    Streams the file with ``ijson`` when it is installed, so large replays
+    are checked without building the full dict. Otherwise ``orjson`` parses
+    the memory-mapped file, and plain ``json`` is the last resort.
+
+    Returns (is_valid, entry_count, issues).
+    """
+    issues: list[str] = []
+
+    if not Path(path).exists():
+        return False, 0, ["Replay file does not exist"]
+
+    try:
+        with open(path, "rb") as f:
+            if ijson is not None:
+                shape = _stream_replay_shape(f)
+            elif orjson is not None:
+                shape = _replay_shape_from_data(_orjson_load_mmap(f))
+            else:
+                shape = _replay_shape_from_data(json.load(f))
+    except OSError as exc:
+        return False, 0, [f"Could not read replay file: {exc}"]
+    except (ValueError, _IJSON_ERRORS) as exc:
+        return False, 0, [f"Replay file is not valid JSON: {exc}"]
+
+    if shape.top_type != "dict":
+        issues.append(f"Expected top-level dict, got {shape.top_type}")
+        return False, 0, issues
+
+    # Check for expected top-level keys
+    for key in ("header", "entries"):
+        if key not in shape.keys:
+            issues.append(f"Missing top-level key: '{key}'")
+
+    if not shape.entries_is_list:
+        issues.append("'entries' is not a list")
+
+    entry_count = shape.entry_count
+
+    # If there is an entry_count field (in header or footer), verify match
+    declared_count = (
+        shape.declared.get("footer")
+        or shape.declared.get("header")
+        or shape.declared.get("entry_count")
+    )
+    if declared_count is not None and declared_count != entry_count:
+        issues.append(
+            f"Declared entry_count ({declared_count}) != "
+            f"actual entries length ({entry_count})"
+        )
+
+    if entry_count == 0:
+        issues.append("Replay has zero entries")
+
+    is_valid = len(issues) == 0
+    return is_valid, entry_count, issues
@@ -15,20 +15,35 @@ Usage:
 Requirements:
     - Python 3.10+
     - requests (pip install requests)
+    - orjson (optional, pip install orjson) for faster JSON encode/decode
+    - ijson (optional, pip install ijson) to stream-validate large replays
     - Game binary with --agent mode support
 """
 
 import argparse
-import json
 import logging
 import os
-import subprocess
+import queue
 import sys
 import time
-from dataclasses import dataclass, field
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
 from pathlib import Path
 
-import requests
+from requests.adapters import HTTPAdapter
+
+from e2e_llm import (
+    DEFAULT_LLM_TIMEOUT,
+    SESSION,
+    SYSTEM_PROMPT,
+    call_llm,
+    format_observation,
+    parse_llm_turns,
+    trim_history,
+)
+from e2e_replay import validate_replay
+from llm_game import GameProcess
+from llm_json import ActionStream, json_dumps, unstreamed_actions
 
 logging.basicConfig(
     level=logging.INFO,
@@ -37,27 +52,11 @@ logging.basicConfig(
 )
 log = logging.getLogger("e2e_smoke")
 
-OPENROUTER_URL = "https://openrouter.ai/api/v1/chat/completions"
 DEFAULT_MODEL = "anthropic/claude-sonnet-4.5"
-
-SYSTEM_PROMPT = """\
-You are playing Megacity, a 256x256 grid city builder.
-Each turn you receive city stats and respond with building actions.
-
-Available actions (respond with JSON array):
-- {"PlaceRoadLine": {"start": [x,y], "end": [x,y], "road_type": "Avenue"}}
-- {"ZoneRect": {"min": [x,y], "max": [x,y], "zone_type": "ResidentialLow"}}
-- {"PlaceUtility": {"pos": [x,y], "utility_type": "PowerPlant"}}
-- {"PlaceUtility": {"pos": [x,y], "utility_type": "WaterTower"}}
-- {"PlaceService": {"pos": [x,y], "service_type": "FireStation"}}
-
-Strategy: Build an avenue, place PowerPlant and WaterTower near it, \
-zone residential and commercial along it.
-
-Respond with ONLY a JSON array of actions. Example:
-[{"PlaceRoadLine": {"start": [120,128], "end": [140,128], "road_type": "Avenue"}}, \
-{"PlaceUtility": {"pos": [118,128], "utility_type": "PowerPlant"}}]
-"""
+DEFAULT_LLM_BATCH = 4
+# Beyond ~8 observations per prompt the decode cost of the longer answer
+# outweighs the saved round trips.
+MAX_LLM_BATCH = 8
 
 
 # ---------------------------------------------------------------------------
@@ -83,222 +82,32 @@ class SmokeStats:
     elapsed: float = 0.0
 
 
-# ---------------------------------------------------------------------------
-# Game process wrapper
-# ---------------------------------------------------------------------------
-
-class GameProcess:
-    """Manages the game subprocess in --agent mode."""
-
-    def __init__(self, binary: str, seed: int | None = None):
-        if not Path(binary).exists():
-            raise FileNotFoundError(
-                f"Game binary not found at '{binary}'. "
-                "Build it first with: cargo build --release -p app"
-            )
-        cmd = [binary, "--agent"]
-        if seed is not None:
-            cmd.extend(["--seed", str(seed)])
-        log.info("Starting game: %s", " ".join(cmd))
-        self.proc = subprocess.Popen(
-            cmd,
-            stdin=subprocess.PIPE,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.DEVNULL,
-            text=True,
-            bufsize=1,
-        )
-        # Consume the "ready" handshake message before sending commands.
-        ready_line = self.proc.stdout.readline()
-        if not ready_line:
-            raise ConnectionError("Game process closed stdout before ready")
-        ready = json.loads(ready_line)
-        if ready.get("type") != "ready":
-            raise RuntimeError(f"Expected 'ready' handshake, got: {ready}")
-
-    def send(self, command: dict) -> dict:
-        """Send a JSON command and read the JSON response."""
-        line = json.dumps(command, separators=(",", ":"))
-        log.debug(">>> %s", line)
-        self.proc.stdin.write(line + "\n")
-        self.proc.stdin.flush()
-        response_line = self.proc.stdout.readline()
-        if not response_line:
-            raise ConnectionError("Game process closed stdout unexpectedly")
-        log.debug("<<< %s", response_line.strip())
-        return json.loads(response_line)
-
-    def observe(self) -> dict:
-        return self.send({"cmd": "observe"})
-
-    def act(self, action: dict) -> dict:
-        return self.send({"cmd": "act", "action": action})
-
-    def step(self, ticks: int) -> dict:
-        return self.send({"cmd": "step", "ticks": ticks})
-
-    def new_game(self, seed: int) -> dict:
-        return self.send({"cmd": "new_game", "seed": seed})
-
-    def save_replay(self, path: str) -> dict:
-        return self.send({"cmd": "save_replay", "path": path})
-
-    def quit(self):
-        try:
-            self.send({"cmd": "quit"})
-        except (ConnectionError, BrokenPipeError):
-            pass
-        try:
-            self.proc.terminate()
-            self.proc.wait(timeout=5)
-        except Exception:
-            self.proc.kill()
-
-    def __enter__(self):
-        return self
-
-    def __exit__(self, *_):
-        self.quit()
-
-
 # ---------------------------------------------------------------------------
 # LLM helpers
 # ---------------------------------------------------------------------------
 
-def call_llm(api_key: str, model: str, messages: list[dict]) -> str:
-    """Call OpenRouter API and return the assistant content string."""
-    headers = {
-        "Authorization": f"Bearer {api_key}",
-        "Content-Type": "application/json",
-        "HTTP-Referer": "https://github.com/dzautner/megacity",
-        "X-Title": "Megacity E2E Smoke Test",
-    }
-    payload = {
-        "model": model,
-        "messages": messages,
-        "temperature": 0.7,
-        "max_tokens": 2048,
-    }
-    for attempt in range(3):
-        try:
-            resp = requests.post(
-                OPENROUTER_URL, headers=headers, json=payload, timeout=60,
-            )
-            resp.raise_for_status()
-            return resp.json()["choices"][0]["message"]["content"]
-        except (requests.RequestException, KeyError, json.JSONDecodeError) as exc:
-            log.warning("LLM API attempt %d failed: %s", attempt + 1, exc)
-            if attempt < 2:
-                time.sleep(2 ** attempt)
-    raise RuntimeError("OpenRouter API failed after 3 attempts")
-
-
-def parse_llm_actions(content: str) -> list[dict]:
-    """Parse the LLM response into a list of action dicts.
-
-    Handles: raw JSON arrays, markdown-fenced JSON, JSON embedded in prose.
-    """
-    text = content.strip()
-
-    # Strip markdown code fences
-    if text.startswith("```"):
-        lines = text.split("\n")
-        lines = [l for l in lines if not l.strip().startswith("```")]
-        text = "\n".join(lines).strip()
-
-    # Try direct parse
-    try:
-        parsed = json.loads(text)
-        if isinstance(parsed, list):
-            return parsed
-        if isinstance(parsed, dict) and "actions" in parsed:
-            return parsed["actions"]
-    except json.JSONDecodeError:
-        pass
-
-    # Try to find JSON array in text
-    start = text.find("[")
-    end = text.rfind("]")
-    if start != -1 and end > start:
-        try:
-            parsed = json.loads(text[start : end + 1])
-            if isinstance(parsed, list):
-                return parsed
-        except json.JSONDecodeError:
-            pass
-
-    # Try to find JSON object with "actions" key
-    start = text.find("{")
-    end = text.rfind("}")
-    if start != -1 and end > start:
-        try:
-            parsed = json.loads(text[start : end + 1])
-            if isinstance(parsed, dict) and "actions" in parsed:
-                return parsed["actions"]
-        except json.JSONDecodeError:
-            pass
-
-    log.warning("Could not parse LLM response as actions: %s", text[:200])
-    return []
-
-
-def format_observation(obs: dict) -> str:
-    """Format a city observation into a concise summary for the LLM."""
-    parts = [f"Turn observation (tick {obs.get('tick', '?')}):"]
-
-    # Economy
-    treasury = obs.get("treasury", 0)
-    income = obs.get("monthly_income", 0)
-    expenses = obs.get("monthly_expenses", 0)
-    parts.append(
-        f"Treasury: ${treasury:,.0f} | "
-        f"Income: ${income:,.0f} | "
-        f"Expenses: ${expenses:,.0f}"
-    )
-
-    # Population
-    pop = obs.get("population", {})
-    total = pop.get("total", 0)
-    employed = pop.get("employed", 0)
-    parts.append(f"Population: {total} (employed: {employed})")
-
-    # Happiness
-    hap = obs.get("happiness", {})
-    overall = hap.get("overall", 0)
-    parts.append(f"Happiness: {overall:.1f}/100")
-
-    # Coverage
-    power_cov = obs.get("power_coverage", 0)
-    water_cov = obs.get("water_coverage", 0)
-    parts.append(f"Power: {power_cov:.0%} | Water: {water_cov:.0%}")
-
-    # Zone demand
-    zd = obs.get("zone_demand", {})
-    parts.append(
-        f"Demand -> R: {zd.get('residential', 0):.0f} "
-        f"C: {zd.get('commercial', 0):.0f} "
-        f"I: {zd.get('industrial', 0):.0f} "
-        f"O: {zd.get('office', 0):.0f}"
-    )
-
-    # Warnings
-    warnings = obs.get("warnings", [])
-    if warnings:
-        parts.append("Warnings: " + "; ".join(warnings[:5]))
-
-    parts.append("Respond with a JSON array of actions.")
-    return "\n".join(parts)
-
-
 # ---------------------------------------------------------------------------
 # Phase 1: Play the game
 # ---------------------------------------------------------------------------
 
 def play_game(args: argparse.Namespace, api_key: str) -> SmokeStats:
-    """Launch the game, play N turns with LLM, save replay, return stats."""
+    """Launch the game, play N turns with LLM, save replay, return stats.
+
+    Turns are played in batches of ``args.llm_batch``: the game is stepped
+    and observed once per turn, then a single LLM call answers every
+    observation in the batch with one action array per turn.
+
+    The LLM call runs on a worker thread. With ``args.overlap_llm`` the next
+    batch is stepped and observed while that call is in flight, so the
+    answer is applied one batch late but the game never sits idle. With
+    ``args.stream_llm`` the answer is streamed and each action is sent to
+    the game as soon as its JSON object closes.
+    """
     stats = SmokeStats(start_time=time.time(), replay_path=args.replay_path)
+    batch_size = max(1, min(args.llm_batch, MAX_LLM_BATCH))
 
-    with GameProcess(args.binary, seed=args.seed) as game:
+    with GameProcess(args.binary, seed=args.seed) as game, \
+            ThreadPoolExecutor(max_workers=1) as pool:
         # Initialize new game
         log.info("Sending new_game with seed %d", args.seed)
         game.new_game(args.seed)
@@ -307,80 +116,53 @@ def play_game(args: argparse.Namespace, api_key: str) -> SmokeStats:
             {"role": "system", "content": SYSTEM_PROMPT},
         ]
 
-        for turn in range(1, args.turns + 1):
-            log.info("=== Turn %d/%d ===", turn, args.turns)
-
-            # Step simulation
-            try:
-                game.step(args.ticks_per_turn)
-            except Exception as exc:
-                log.error("step failed on turn %d: %s", turn, exc)
+        turn = 0
+        stop = False
+        # (future, last turn of the batch, batch length, streamed actions
+        # queue or None) of the in-flight call
+        pending: tuple[Future, int, int, queue.Queue | None] | None = None
+        while True:
+            blocks: list[str] = []
+            if not stop and turn < args.turns:
+                count = min(batch_size, args.turns - turn)
+                turn, stop = _observe_batch(game, args, stats, turn, count, blocks)
+
+            # Apply the in-flight LLM answer before asking the next question
+            if pending is not None:
+                _apply_llm_response(game, pending, conversation, stats)
+                pending = None
+
+            if not blocks:
                 break
 
-            # Observe
-            try:
-                obs_response = game.observe()
-                observation = obs_response.get("observation", obs_response)
-            except Exception as exc:
-                log.error("observe failed on turn %d: %s", turn, exc)
-                break
-
-            # Track city state
-            stats.final_treasury = observation.get("treasury", 0)
-            pop = observation.get("population", {})
-            stats.final_population = pop.get("total", 0)
-            hap = observation.get("happiness", {})
-            stats.final_happiness = hap.get("overall", 0)
-
             # Format for LLM
-            user_msg = format_observation(observation)
+            user_msg = (
+                "\n\n".join(blocks)
+                + f"\n\nRespond with {{\"turns\": [...]}} holding "
+                f"{len(blocks)} action array(s), one per turn above."
+            )
 
-            # Keep conversation manageable: system + last 4 exchanges + new
-            if len(conversation) > 9:
-                conversation = [conversation[0]] + conversation[-8:]
             conversation.append({"role": "user", "content": user_msg})
-
-            # Call LLM
-            try:
-                response_text = call_llm(api_key, args.model, conversation)
-                conversation.append(
-                    {"role": "assistant", "content": response_text}
-                )
-            except Exception as exc:
-                log.error("LLM call failed on turn %d: %s", turn, exc)
-                stats.llm_errors += 1
-                stats.turns_played = turn
-                continue
-
-            # Parse actions
-            actions = parse_llm_actions(response_text)
-            log.info("LLM returned %d action(s)", len(actions))
-
-            # Execute actions
-            for action in actions:
-                stats.actions_sent += 1
-                try:
-                    result = game.act(action)
-                    if result.get("result") == "Success":
-                        stats.actions_succeeded += 1
-                        log.info("  OK: %s", _summarize(action))
-                    else:
-                        stats.actions_failed += 1
-                        log.warning(
-                            "  FAIL: %s -> %s",
-                            _summarize(action),
-                            result.get("error", result.get("result", "?")),
-                        )
-                except Exception as exc:
-                    stats.actions_failed += 1
-                    log.error("  ERROR sending action: %s", exc)
-
-            stats.turns_played = turn
-
-            # Early exit if bankrupt
-            if stats.final_treasury < -100_000:
-                log.warning("City is deeply bankrupt, stopping early")
-                break
+            trim_history(conversation)
+
+            # Call LLM once for the whole batch
+            streamed = on_delta = None
+            if args.stream_llm:
+                streamed = queue.Queue()
+                on_delta = ActionStream(
+                    lambda *item, q=streamed: q.put(item), len(blocks),
+                ).feed
+            future = pool.submit(
+                call_llm, api_key, args.model, list(conversation),
+                max(2048, 768 * len(blocks)), args.llm_timeout, on_delta,
+            )
+            if streamed is not None:
+                # Wake the consumer once the call is over, however it ended
+                future.add_done_callback(lambda _, q=streamed: q.put(None))
+            pending = (future, turn, len(blocks), streamed)
+            if not args.overlap_llm:
+                _apply_llm_response(game, pending, conversation, stats)
+                pending = None
 
         # Save replay
         log.info("Saving replay to %s", args.replay_path)
@@ -394,74 +176,122 @@ def play_game(args: argparse.Namespace, api_key: str) -> SmokeStats:
     return stats
 
 
-def _summarize(action: dict) -> str:
-    """Return a short summary string for an action dict."""
-    if isinstance(action, dict):
-        for key, val in action.items():
-            return f"{key}({json.dumps(val, separators=(',', ':'))})"
-    return str(action)[:80]
+def _observe_batch(
+    game: GameProcess, args: argparse.Namespace, stats: SmokeStats,
+    turn: int, count: int, blocks: list[str],
+) -> tuple[int, bool]:
+    """Step and observe up to *count* turns, appending prompt blocks.
 
+    Returns the last turn reached and whether the session should stop.
+    """
+    for _ in range(count):
+        turn += 1
+        log.info("=== Turn %d/%d ===", turn, args.turns)
 
-# ---------------------------------------------------------------------------
-# Phase 2: Validate the replay
-# ---------------------------------------------------------------------------
+        # Step simulation and observe in one pipe round trip
+        try:
+            _, obs_response = game.step_and_observe(args.ticks_per_turn)
+            observation = obs_response.get("observation", obs_response)
+        except Exception as exc:
+            log.error("step/observe failed on turn %d: %s", turn, exc)
+            return turn, True
+
+        # Track city state
+        stats.final_treasury = observation.get("treasury", 0)
+        pop = observation.get("population", {})
+        stats.final_population = pop.get("total", 0)
+        hap = observation.get("happiness", {})
+        stats.final_happiness = hap.get("overall", 0)
+        stats.turns_played = turn
+
+        blocks.append(f"=== Turn {turn} ===\n{format_observation(observation)}")
+
+        # Early exit if bankrupt
+        if stats.final_treasury < -100_000:
+            log.warning("City is deeply bankrupt, stopping early")
+            return turn, True
+    return turn, False
+
+
+def _apply_llm_response(
+    game: GameProcess, pending: tuple[Future, int, int, queue.Queue | None],
+    conversation: list[dict], stats: SmokeStats,
+):
+    """Wait for an LLM call and execute the action arrays it returned.
+
+    Actions that arrive on the streaming queue are executed while the call
+    is still running; the final parse then decides what is left to run.
+    """
+    future, turn, batch_len, streamed = pending
+    sent: list[list[dict]] = [[] for _ in range(batch_len)]
+    while streamed is not None and (item := streamed.get()) is not None:
+        turn_index, action = item
+        _execute_actions(game, [action], stats)
+        sent[turn_index].append(action)
+    try:
+        response_text = future.result()
+    except Exception as exc:
+        log.error("LLM call failed on turn %d: %s", turn, exc)
+        stats.llm_errors += 1
+        return
+    conversation.append({"role": "assistant", "content": response_text})
+
+    # Parse one action array per turn in the batch
+    turn_actions = parse_llm_turns(response_text)[:batch_len]
+    log.info(
+        "LLM returned %d action(s) across %d turn(s)",
+        sum(len(a) for a in turn_actions), len(turn_actions),
+    )
 
-def validate_replay(path: str) -> tuple[bool, int, list[str]]:
-    """Validate the replay file at *path*.
+    # Execute actions not already sent while streaming
+    for index, already_sent in enumerate(sent):
+        actions = turn_actions[index] if index < len(turn_actions) else []
+        _execute_actions(game, unstreamed_actions(actions, already_sent), stats)
 
-    Returns (is_valid, entry_count, issues).
-    """
-    issues: list[str] = []
 
-    if not Path(path).exists():
-        return False, 0, ["Replay file does not exist"]
+def _execute_actions(game: GameProcess, actions: list[dict], stats: SmokeStats):
+    """Send each action to the game and tally the outcome in *stats*."""
+    for action in actions:
+        stats.actions_sent += 1
+        try:
+            result = game.act(action)
+            if result.get("result") == "Success":
+                stats.actions_succeeded += 1
+                log.info("  OK: %s", _ActionSummary(action))
+            else:
+                stats.actions_failed += 1
+                log.warning(
+                    "  FAIL: %s -> %s",
+                    _ActionSummary(action),
+                    result.get("error", result.get("result", "?")),
+                )
+        except Exception as exc:
+            stats.actions_failed += 1
+            log.error("  ERROR sending action: %s", exc)
 
-    try:
-        raw = Path(path).read_text()
-    except Exception as exc:
-        return False, 0, [f"Could not read replay file: {exc}"]
 
-    try:
-        data = json.loads(raw)
-    except json.JSONDecodeError as exc:
-        return False, 0, [f"Replay file is not valid JSON: {exc}"]
-
-    if not isinstance(data, dict):
-        issues.append(f"Expected top-level dict, got {type(data).__name__}")
-        return False, 0, issues
-
-    # Check for expected top-level keys
-    for key in ("header", "entries"):
-        if key not in data:
-            issues.append(f"Missing top-level key: '{key}'")
-
-    entries = data.get("entries", [])
-    if not isinstance(entries, list):
-        issues.append("'entries' is not a list")
-        entries = []
-
-    entry_count = len(entries)
-
-    # If there is an entry_count field (in header or footer), verify match
-    header = data.get("header", {})
-    footer = data.get("footer", {})
-    declared_count = (
-        footer.get("entry_count")
-        or header.get("entry_count")
-        or data.get("entry_count")
-    )
-    if declared_count is not None and declared_count != entry_count:
-        issues.append(
-            f"Declared entry_count ({declared_count}) != "
-            f"actual entries length ({entry_count})"
-        )
+class _ActionSummary:
+    """Log argument that renders a short action summary only when emitted.
 
-    if entry_count == 0:
-        issues.append("Replay has zero entries")
+    ``logging`` calls ``str()`` on its arguments lazily, so actions logged
+    below the active level are never serialized.
+    """
+
+    __slots__ = ("action",)
+
+    def __init__(self, action: dict):
+        self.action = action
+
+    def __str__(self) -> str:
+        if isinstance(self.action, dict):
+            for key, val in self.action.items():
+                return f"{key}({json_dumps(val).decode()})"
+        return str(self.action)[:80]
 
-    is_valid = len(issues) == 0
-    return is_valid, entry_count, issues
 
+# ---------------------------------------------------------------------------
+# Phase 2: Validate the replay
+# ---------------------------------------------------------------------------
 
 # ---------------------------------------------------------------------------
 # Phase 3: Report
@@ -508,6 +338,27 @@ def print_report(stats: SmokeStats, replay_valid: bool, replay_entries: int,
 # Main
 # ---------------------------------------------------------------------------
 
+def run_smoke_test(
+    args: argparse.Namespace, api_key: str,
+) -> tuple[SmokeStats, bool, int, list[str]]:
+    """Play one game and validate its replay.
+
+    Returns the arguments for :func:`print_report`.
+    """
+    # Phase 1: LLM plays the game
+    log.info(
+        "Phase 1: LLM plays the game (%d turns, seed %d)", args.turns, args.seed,
+    )
+    stats = play_game(args, api_key)
+
+    # Phase 2: Validate replay
+    log.info("Phase 2: Validating replay at %s", args.replay_path)
+    replay_valid, replay_entries, replay_issues = validate_replay(
+        args.replay_path,
+    )
+    return stats, replay_valid, replay_entries, replay_issues
+
+
 def main():
     parser = argparse.ArgumentParser(
         description="E2E smoke test: LLM plays Megacity and produces a replay",
@@ -532,6 +383,38 @@ def main():
         "--ticks-per-turn", type=int, default=100,
         help="Simulation ticks per turn (default: 100)",
     )
+    parser.add_argument(
+        "--llm-batch", type=int, default=DEFAULT_LLM_BATCH,
+        help=(
+            "Turns answered per LLM call (default: "
+            f"{DEFAULT_LLM_BATCH}, max: {MAX_LLM_BATCH})"
+        ),
+    )
+    parser.add_argument(
+        "--llm-timeout", type=float, default=DEFAULT_LLM_TIMEOUT,
+        help=(
+            "Per-attempt OpenRouter timeout in seconds "
+            f"(default: {DEFAULT_LLM_TIMEOUT:g})"
+        ),
+    )
+    parser.add_argument(
+        "--overlap-llm", action="store_true",
+        help=(
+            "Step the next batch while the LLM answers the current one "
+            "(actions land one batch later)"
+        ),
+    )
+    parser.add_argument(
+        "--stream-llm", action="store_true",
+        help="Stream LLM answers and send each action as soon as it is complete",
+    )
+    parser.add_argument(
+        "--parallel-games", type=int, default=1,
+        help=(
+            "Play N games concurrently with seeds seed..seed+N-1; replays "
+            "get a _<i> suffix (default: 1)"
+        ),
+    )
     parser.add_argument(
         "--replay-path", default="/tmp/megacity_e2e_replay.json",
         help="Path for the replay file (default: /tmp/megacity_e2e_replay.json)",
@@ -541,6 +424,9 @@ def main():
         help="Enable debug logging",
     )
     args = parser.parse_args()
+    if args.overlap_llm and args.stream_llm:
+        # Streamed actions would only be sent after the next batch stepped
+        parser.error("--overlap-llm cannot be combined with --stream-llm")
 
     if args.verbose:
         logging.getLogger().setLevel(logging.DEBUG)
@@ -565,19 +451,26 @@ def main():
         )
         sys.exit(1)
 
-    # Phase 1: LLM plays the game
-    log.info("Phase 1: LLM plays the game (%d turns)", args.turns)
-    stats = play_game(args, api_key)
-
-    # Phase 2: Validate replay
-    log.info("Phase 2: Validating replay at %s", args.replay_path)
-    replay_valid, replay_entries, replay_issues = validate_replay(
-        args.replay_path,
-    )
-
-    # Phase 3: Report
-    ok = print_report(stats, replay_valid, replay_entries, replay_issues)
-
+    if args.parallel_games <= 1:
+        ok = print_report(*run_smoke_test(args, api_key))
+        sys.exit(0 if ok else 1)
+
+    # Independent games, one thread each: every game has its own pipes and
+    # the threads mostly wait on the game or on OpenRouter.
+    n = args.parallel_games
+    SESSION.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=n))
+    replay = Path(args.replay_path)
+    game_args = [
+        argparse.Namespace(**{
+            **vars(args),
+            "seed": args.seed + i,
+            "replay_path": str(replay.with_stem(f"{replay.stem}_{i}")),
+        })
+        for i in range(n)
+    ]
+    with ThreadPoolExecutor(max_workers=n) as pool:
+        results = list(pool.map(run_smoke_test, game_args, [api_key] * n))
+    ok = all([print_report(*result) for result in results])
     sys.exit(0 if ok else 1)
 
 
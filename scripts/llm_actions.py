@@ -0,0 +1,283 @@
+"""
+Turn the LLM's answer into game actions.
+
+Parses the (often messy) answer, fixes common parameter mistakes, and plans
+the utilities and roads injected when the LLM leaves coverage low or does
+nothing.
+"""
+
+import logging
+import re
+
+from llm_json import ACTION_TYPES, iter_json_values, json_loads
+from llm_map import COORD_KEYS, SessionState, action_hits_water
+
+log = logging.getLogger("llm_player")
+
+_FENCE_RE = re.compile(r"```\w*\s*")
+# Salvaged action objects are grouped by type in ACTION_TYPES order (roads first).
+_ACTION_TYPE_ORDER = {action_type: i for i, action_type in enumerate(ACTION_TYPES)}
+# One alternation, so the text is scanned once rather than once per type
+_ACTION_OBJECT_RE = re.compile(
+    r'\{"(' + "|".join(ACTION_TYPES) + r')"\s*:\s*\{[^}]*\}\s*\}'
+)
+
+
+def parse_response(content: str) -> dict:
+    """Parse LLM response as either {"actions": [...]} or {"query": [...]}."""
+    # Strip markdown fences (```json ... ```)
+    text = _FENCE_RE.sub("", content.strip()).strip()
+    text = text.rstrip('`').strip()
+
+    # Try direct parse
+    try:
+        parsed = json_loads(text)
+        if isinstance(parsed, dict):
+            return parsed
+        if isinstance(parsed, list):
+            return {"actions": parsed}
+    except ValueError:
+        pass
+
+    # Single scan for embedded JSON: prefer an {"actions"/"query"} object,
+    # then a bare list of action objects
+    first_dict = None
+    for value in iter_json_values(text):
+        if isinstance(value, dict):
+            if "actions" in value or "query" in value:
+                return value
+            if first_dict is None:
+                first_dict = value
+        elif value and all(isinstance(item, dict) for item in value):
+            return {"actions": value}
+
+    # Try to extract individual action objects from text
+    found = []
+    m = _ACTION_OBJECT_RE.search(text)
+    while m:
+        try:
+            found.append((_ACTION_TYPE_ORDER[m.group(1)], json_loads(m.group())))
+        except ValueError:
+            # A truncated object can swallow the start of the next one
+            m = _ACTION_OBJECT_RE.search(text, m.start() + 1)
+        else:
+            m = _ACTION_OBJECT_RE.search(text, m.end())
+    found.sort(key=lambda item: item[0])
+    actions = [action for _, action in found]
+    if actions:
+        return {"actions": actions}
+    if first_dict is not None:
+        return first_dict
+
+    # Try to fix truncated JSON by adding closing brackets
+    for start_char in ["{", "["]:
+        start = text.find(start_char)
+        if start != -1:
+            fragment = text[start:]
+            for suffix in ["]}", "]}}", "}", "]}}}", '"]}']:
+                try:
+                    parsed = json_loads(fragment + suffix)
+                    if isinstance(parsed, list):
+                        return {"actions": parsed}
+                    if isinstance(parsed, dict):
+                        return parsed
+                except ValueError:
+                    continue
+
+    log.warning("Could not parse LLM response: %s", text[:200])
+    return {"actions": []}
+
+
+ZONE_TYPE_ALIASES = {
+    "IndustrialLow": "Industrial",
+    "IndustrialHigh": "Industrial",
+    "OfficeLow": "Office",
+    "OfficeHigh": "Office",
+    "ResLow": "ResidentialLow",
+    "ResHigh": "ResidentialHigh",
+    "ComLow": "CommercialLow",
+    "ComHigh": "CommercialHigh",
+    "Residential": "ResidentialLow",
+    "Commercial": "CommercialLow",
+    "MixedUse": "MixedUse",
+}
+
+# Lowercased LLM road names -> RoadType; anything unknown becomes Local.
+ROAD_TYPE_ALIASES = {
+    "local": "Local", "avenue": "Avenue", "boulevard": "Boulevard",
+    "highway": "Highway", "main": "Avenue", "arterial": "Avenue",
+    "collector": "Local", "residential": "Local",
+}
+
+# Service types the LLM tends to place with PlaceUtility.
+SERVICE_TYPES_AS_UTILITY = frozenset({
+    "WaterTreatmentPlant", "Landfill", "RecyclingCenter", "Incinerator",
+    "Cemetery", "Crematorium", "SmallPark", "LargePark", "Library",
+})
+
+
+TAX_FLOOR = 0.08  # Enforce minimum 8% tax rate — LLM keeps lowering to 1-2%
+TAX_KEYS = ("residential", "commercial", "industrial", "office")
+
+
+def normalize_action(action: dict) -> dict:
+    """Fix common LLM mistakes in action parameters."""
+    if not isinstance(action, dict):
+        return action
+    for key, params in action.items():
+        if isinstance(params, dict):
+            # Fix zone type aliases
+            if "zone_type" in params:
+                zt = params["zone_type"]
+                params["zone_type"] = ZONE_TYPE_ALIASES.get(zt, zt)
+            # Fix road type aliases
+            if "road_type" in params:
+                params["road_type"] = ROAD_TYPE_ALIASES.get(params["road_type"].lower(), "Local")
+            # Ensure coordinate values are integers (usually they already are)
+            for coord_key in COORD_KEYS:
+                coords = params.get(coord_key)
+                if isinstance(coords, list) and not all(type(v) is int for v in coords):
+                    params[coord_key] = [int(round(v)) for v in coords]
+            # Cap zone rects to max 3 cells deep (water only reaches 1 cell from roads)
+            if key == "ZoneRect" and "min" in params and "max" in params:
+                mn, mx = params["min"], params["max"]
+                if isinstance(mn, list) and isinstance(mx, list) and len(mn) >= 2 and len(mx) >= 2:
+                    dx = mx[0] - mn[0]
+                    dy = mx[1] - mn[1]
+                    if dx > 20:  # cap width to 20
+                        mx[0] = mn[0] + 20
+                    if dy > 3:  # cap depth to 3 (1-2 cells from road each side)
+                        mx[1] = mn[1] + 3
+                    if dx < -20:
+                        mn[0] = mx[0] + 20
+                    if dy < -3:
+                        mn[1] = mx[1] + 3
+            # Enforce minimum tax rates — LLM keeps setting 1-3% causing bankruptcy
+            if key == "SetTaxRates":
+                for tax_key in TAX_KEYS:
+                    if tax_key in params:
+                        val = float(params[tax_key])
+                        if val < TAX_FLOOR:
+                            log.info("  Tax floor: %s %.1f%% -> %.1f%%", tax_key, val*100, TAX_FLOOR*100)
+                            params[tax_key] = TAX_FLOOR
+
+    # Fix service types used as utilities: WaterTreatmentPlant, Landfill, etc. are services
+    if isinstance(action, dict) and "PlaceUtility" in action:
+        ut = action["PlaceUtility"].get("utility_type", "")
+        if ut in SERVICE_TYPES_AS_UTILITY:
+            log.info("  Fixing: %s is a service, not utility", ut)
+            action = {"PlaceService": {"pos": action["PlaceUtility"]["pos"], "service_type": ut}}
+
+    return action
+
+
+def _furthest_index(positions: list, candidates: list) -> int:
+    """Index of the candidate cell furthest from any position in the reference list."""
+    if not positions:
+        # No reference points: pick from the middle of candidates
+        return len(candidates) // 2
+    best_index = 0
+    best_dist = -1
+    for i, pos in enumerate(candidates):
+        px, py = pos[0], pos[1]
+        min_dist = 1 << 30
+        for rx, ry in positions:
+            d = abs(px - rx) + abs(py - ry)
+            if d < min_dist:
+                min_dist = d
+                # Already no further than the best so far: can't win
+                if d <= best_dist:
+                    break
+        if min_dist > best_dist:
+            best_dist = min_dist
+            best_index = i
+    return best_index
+
+
+def inject_critical_utilities(obs: dict, llm_actions: list, state: SessionState) -> list:
+    """Auto-inject WaterTower/PowerPlant when coverage is critically low.
+
+    WaterTowers are placed at positions FURTHEST from existing WaterTowers
+    to maximize new coverage area instead of clustering.
+    """
+    injected = []
+    treasury = obs.get("treasury", 0)
+    power_cov = obs.get("power_coverage", 0)
+    water_cov = obs.get("water_coverage", 0)
+
+    if treasury < 500:
+        return []
+    # Nothing below would inject anything; skip the action scan and road copy
+    if water_cov >= 0.8 and (power_cov >= 0.8 or treasury < 1200):
+        return []
+
+    # Check if LLM already placed the needed utility type this turn
+    llm_utility_types = set()
+    for a in llm_actions:
+        if isinstance(a, dict) and "PlaceUtility" in a:
+            llm_utility_types.add(a["PlaceUtility"].get("utility_type", ""))
+
+    available_road = list(state.available_road)
+    if not available_road:
+        return []
+
+    # Water < 80%: inject WaterTowers at spatially optimal positions
+    if water_cov < 0.8 and treasury >= 200:
+        count = 2 if water_cov < 0.5 else 1
+        for _ in range(min(count, len(available_road))):
+            i = _furthest_index(state.water_tower_positions, available_road)
+            # Swap-remove: O(1), and the list's order is arbitrary anyway
+            pos = available_road[i]
+            available_road[i] = available_road[-1]
+            available_road.pop()
+            injected.append({"PlaceUtility": {"pos": list(pos), "utility_type": "WaterTower"}})
+
+    # Power < 80% and LLM didn't place PowerPlant
+    if power_cov < 0.8 and "PowerPlant" not in llm_utility_types and treasury >= 1200:
+        if available_road:
+            pos = available_road[_furthest_index([], available_road)]  # just pick middle
+            injected.append({"PlaceUtility": {"pos": list(pos), "utility_type": "PowerPlant"}})
+
+    return injected
+
+
+def generate_fallback_actions(obs: dict, state: SessionState) -> list:
+    """Generate sensible fallback actions when the LLM returns nothing.
+
+    Prevents the city from stagnating during idle turns by auto-placing
+    critical infrastructure (WaterTower, PowerPlant) and extending roads.
+    """
+    actions = []
+    treasury = obs.get("treasury", 0)
+    power_cov = obs.get("power_coverage", 0)
+    water_cov = obs.get("water_coverage", 0)
+
+    if treasury < 500:
+        return []  # Can't afford anything
+
+    # Find available road cells for utility placement
+    available_road = sorted(state.available_road)
+
+    # Priority 1: Place WaterTower if water < 80%
+    if water_cov < 0.8 and available_road and treasury >= 200:
+        pos = available_road[0]
+        actions.append({"PlaceUtility": {"pos": list(pos), "utility_type": "WaterTower"}})
+        available_road = available_road[1:]
+
+    # Priority 2: Place PowerPlant if power < 80%
+    if power_cov < 0.8 and available_road and treasury >= 1200:
+        pos = available_road[0]
+        actions.append({"PlaceUtility": {"pos": list(pos), "utility_type": "PowerPlant"}})
+
+    # Priority 3: Extend road network southward in grid pattern
+    if treasury >= 500 and len(actions) < 3:
+        y = state.next_road_y
+        road = {"PlaceRoadLine": {"start": [100, y], "end": [120, y]}}
+        if y < 200 and not action_hits_water(road, state.water_cells):
+            actions.append({"PlaceRoadLine": {"start": [100, y], "end": [120, y], "road_type": "Local"}})
+            # Zone only 1-2 cells deep (adjacent to road for water coverage)
+            actions.append({"ZoneRect": {"min": [100, y + 1], "max": [120, y + 1], "zone_type": "ResidentialLow"}})
+            actions.append({"ZoneRect": {"min": [100, y - 1], "max": [120, y - 1], "zone_type": "Industrial"}})
+            state.next_road_y = y + 3  # Grid spacing: every 3 cells
+
+    return actions
@@ -0,0 +1,136 @@
+"""
+Response caches for the LLM player.
+
+DiskResponseCache replays exact prompts across runs; SemanticCache reuses
+the answer of a near-identical observation within a session.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import re
+from collections import Counter, OrderedDict
+from pathlib import Path
+
+from llm_json import json_dumps, json_loads
+
+log = logging.getLogger("llm_player")
+
+
+class DiskResponseCache:
+    """Content-addressed on-disk cache of LLM response strings.
+
+    One JSON file per key under *cache_dir*; keys come from :meth:`key`.
+    """
+
+    def __init__(self, cache_dir: str | Path):
+        self.cache_dir = Path(cache_dir).expanduser()
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(model: str, temperature: float, messages: list[dict]) -> str:
+        h = hashlib.blake2b(digest_size=20)
+        h.update(json.dumps(messages, sort_keys=True).encode())
+        h.update(f"\0{model}\0{temperature!r}".encode())
+        return h.hexdigest()
+
+    def get(self, key: str) -> str | None:
+        try:
+            with open(self.cache_dir / f"{key}.json", "rb") as f:
+                value = json_loads(f.read())["content"]
+        except (OSError, ValueError, KeyError):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return value
+
+    def put(self, key: str, value: str):
+        path = self.cache_dir / f"{key}.json"
+        tmp = path.with_suffix(f".tmp{os.getpid()}")
+        try:
+            with open(tmp, "wb") as f:
+                f.write(json_dumps({"content": value}))
+            os.replace(tmp, path)
+        except OSError as e:
+            log.warning("Could not write LLM cache entry %s: %s", path, e)
+
+
+_LABELED_NUMBER_RE = re.compile(r"([a-z]+)[^a-z\d\n]*?([-+]?)\$?(\d[\d,]*(?:\.\d+)?)")
+_WORD_RE = re.compile(r"[a-z]+")
+
+
+class SemanticCache:
+    """Reuse the response to a near-identical earlier observation.
+
+    An observation is embedded as its labelled numbers ("treasury" ->
+    10000.0, ...) plus its set of words. Two observations are similar when
+    their numbers are within a small relative distance and they mention the
+    same things (warnings, fix hints). Entries are evicted
+    least-recently-used beyond *max_entries*.
+    """
+
+    def __init__(self, threshold: float = 0.98, max_entries: int = 500):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self._entries: OrderedDict[int, tuple[dict, frozenset, str]] = OrderedDict()
+        self._next_id = 0
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def embed(text: str) -> tuple[dict[str, float], frozenset]:
+        text = text.lower()
+        numbers: dict[str, float] = {}
+        seen: Counter = Counter()
+        for label, sign, digits in _LABELED_NUMBER_RE.findall(text):
+            if label == "turn":
+                continue  # differs every turn by definition
+            seen[label] += 1
+            value = float(digits.replace(",", ""))
+            numbers[f"{label}#{seen[label]}"] = -value if sign == "-" else value
+        return numbers, frozenset(_WORD_RE.findall(text))
+
+    @staticmethod
+    def similarity(
+        a: tuple[dict[str, float], frozenset], b: tuple[dict[str, float], frozenset],
+    ) -> float:
+        """Score in [0, 1]: mean numeric closeness times word-set overlap."""
+        (nums_a, words_a), (nums_b, words_b) = a, b
+        keys = nums_a.keys() | nums_b.keys()
+        closeness = 1.0
+        if keys:
+            total = 0.0
+            for key in keys:
+                if key in nums_a and key in nums_b:
+                    x, y = nums_a[key], nums_b[key]
+                    total += 1.0 - abs(x - y) / max(abs(x), abs(y), 1.0)
+            closeness = total / len(keys)
+        union = words_a | words_b
+        overlap = len(words_a & words_b) / len(union) if union else 1.0
+        return closeness * overlap
+
+    def lookup(self, observation: str) -> str | None:
+        """Return the cached response for the closest match, if close enough."""
+        query = self.embed(observation)
+        best_id, best_sim = None, 0.0
+        for entry_id, (numbers, words, _) in self._entries.items():
+            sim = self.similarity(query, (numbers, words))
+            if sim > best_sim:
+                best_id, best_sim = entry_id, sim
+        if best_id is None or best_sim < self.threshold:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._entries.move_to_end(best_id)
+        log.debug("Semantic cache hit (similarity %.3f)", best_sim)
+        return self._entries[best_id][2]
+
+    def add(self, observation: str, response: str):
+        numbers, words = self.embed(observation)
+        self._entries[self._next_id] = (numbers, words, response)
+        self._next_id += 1
+        if len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
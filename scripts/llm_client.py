@@ -0,0 +1,216 @@
+"""
+OpenRouter client for the LLM player: pooled HTTP session, rate limiting,
+retries, SSE streaming and the optional disk cache.
+"""
+
+import json
+import logging
+import threading
+import time
+from collections import deque
+from collections.abc import Callable
+
+import requests
+
+from llm_cache import DiskResponseCache
+from llm_json import json_dumps, read_sse_content
+
+log = logging.getLogger("llm_player")
+
+OPENROUTER_URL = "https://openrouter.ai/api/v1/chat/completions"
+DEFAULT_SUMMARY_MODEL = "anthropic/claude-haiku-4.5"
+
+SUMMARY_PROMPT = """\
+You maintain the running history of a Megacity city-building session.
+You receive the previous history and a log of the latest turns. Rewrite
+them as one history block of at most 8 short lines, under 1000 characters:
+- Preserve factual continuity: where roads, zones, utilities and services
+  were built, treasury and population trends, recurring failures.
+- Collapse multi-bullet narratives into at most 2 sentences per topic.
+- Keep coordinates that matter for future placement; drop everything else.
+Respond with the history block only.
+"""
+
+
+# One keep-alive session per process, shared by every LLMClient, so the
+# TCP+TLS handshake to OpenRouter is paid once even across --seeds sessions.
+HTTP_SESSION = requests.Session()
+# _call_api does its own retrying, so the adapter must not retry underneath it.
+HTTP_SESSION.mount(
+    "https://", requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=8, max_retries=0)
+)
+# (connect, read): fail fast on an unreachable host, wait out slow generations.
+LLM_HTTP_TIMEOUT = (10, 120)
+
+
+def warm_llm_connection() -> threading.Thread:
+    """Open HTTP_SESSION's connection to OpenRouter on a background thread.
+
+    Started before the game boots so the TCP+TLS handshake overlaps it
+    instead of delaying the first turn's LLM call.
+    """
+    def warm():
+        try:
+            HTTP_SESSION.head(OPENROUTER_URL, timeout=5)
+        except requests.RequestException:
+            pass  # Best effort: the first real call pays the handshake instead
+
+    thread = threading.Thread(target=warm, daemon=True)
+    thread.start()
+    return thread
+
+
+class RateLimiter:
+    """Client-side requests/tokens-per-minute budget for LLM calls.
+
+    ``acquire`` waits until a request fits both budgets over the last
+    minute, so a long run slows down ahead of the provider's limit instead
+    of hitting 429s and sitting out the retry backoff.
+    """
+
+    WINDOW = 60.0
+
+    def __init__(
+        self, requests_per_minute: int | None = None,
+        tokens_per_minute: int | None = None,
+    ):
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self._sent: deque[tuple[float, int]] = deque()  # (monotonic time, tokens)
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens: int):
+        """Block until a request of about *tokens* tokens may be sent."""
+        with self._lock:
+            while True:
+                now = time.monotonic()
+                while self._sent and now - self._sent[0][0] >= self.WINDOW:
+                    self._sent.popleft()
+                wait = self._wait_time(now, tokens)
+                if wait <= 0:
+                    break
+                log.info("  rate limit: waiting %.1fs", wait)
+                time.sleep(wait)
+            self._sent.append((now, tokens))
+
+    def _wait_time(self, now: float, tokens: int) -> float:
+        wait = 0.0
+        rpm = self.requests_per_minute
+        if rpm and len(self._sent) >= rpm:
+            # The oldest request that must age out to make room
+            wait = self._sent[-rpm][0] + self.WINDOW - now
+        tpm = self.tokens_per_minute
+        if tpm and self._sent:
+            excess = sum(t for _, t in self._sent) + tokens - tpm
+            freed = 0
+            for sent_at, sent_tokens in self._sent:
+                if excess <= freed:
+                    break
+                freed += sent_tokens
+                wait = max(wait, sent_at + self.WINDOW - now)
+        return wait
+
+
+class LLMClient:
+    """OpenRouter API client."""
+
+    def __init__(
+        self, model: str, api_key: str, temperature: float = 0.7,
+        summary_model: str = DEFAULT_SUMMARY_MODEL,
+        cache: DiskResponseCache | None = None,
+        cache_nondeterministic: bool = False,
+        rate_limiter: RateLimiter | None = None,
+    ):
+        self.model = model
+        self.api_key = api_key
+        self.temperature = temperature
+        self.summary_model = summary_model
+        # Sampling with temperature > 0 is not reproducible, so replaying a
+        # cached answer changes behaviour; only do it when asked to.
+        if cache is not None and temperature > 0 and not cache_nondeterministic:
+            log.info("LLM cache disabled: temperature %.2f > 0", temperature)
+            cache = None
+        self.cache = cache
+        self.rate_limiter = rate_limiter
+        # Static headers are built once; the connection comes from the
+        # module-wide HTTP_SESSION so it outlives this client.
+        self.headers = {
+            "Authorization": f"Bearer {api_key}",
+            "Content-Type": "application/json",
+            "HTTP-Referer": "https://github.com/dzautner/megacity",
+            "X-Title": "Megacity LLM Player",
+        }
+
+    def call(
+        self, messages: list[dict],
+        on_delta: Callable[[str], None] | None = None,
+    ) -> str:
+        """Send messages to LLM and return the response content string.
+
+        With *on_delta* the answer is streamed and each content chunk is
+        passed to it as it arrives (cache hits are returned without any).
+        """
+        if self.cache is not None:
+            key = self.cache.key(self.model, self.temperature, messages)
+            cached = self.cache.get(key)
+            if cached is not None:
+                log.info("  LLM cache hit")
+                return cached
+        response = self._call_api(messages, on_delta=on_delta)
+        content = response["choices"][0]["message"]["content"]
+        if self.cache is not None:
+            self.cache.put(key, content)
+        return content
+
+    def summarize(self, text: str, max_tokens: int = 300) -> str:
+        """Distill session history *text* with the cheap summary model."""
+        messages = [
+            {"role": "system", "content": SUMMARY_PROMPT},
+            {"role": "user", "content": text},
+        ]
+        response = self._call_api(
+            messages, model=self.summary_model, max_tokens=max_tokens, attempts=2,
+        )
+        return response["choices"][0]["message"]["content"]
+
+    def _call_api(
+        self, messages: list[dict], model: str | None = None,
+        max_tokens: int = 4096, attempts: int = 8,
+        on_delta: Callable[[str], None] | None = None,
+    ) -> dict:
+        payload = {
+            "model": model or self.model,
+            "messages": messages,
+            "temperature": self.temperature,
+            "max_tokens": max_tokens,
+        }
+        if on_delta is not None:
+            payload["stream"] = True
+        body = json_dumps(payload)
+        delivered: list[str] = []
+
+        for attempt in range(attempts):
+            if self.rate_limiter is not None:
+                # ~4 characters per input token, plus the whole output budget
+                self.rate_limiter.acquire(len(body) // 4 + max_tokens)
+            try:
+                resp = HTTP_SESSION.post(
+                    OPENROUTER_URL, data=body, headers=self.headers, timeout=LLM_HTTP_TIMEOUT,
+                    stream=on_delta is not None,
+                )
+                resp.raise_for_status()
+                if on_delta is None:
+                    return resp.json()
+                content = read_sse_content(resp, on_delta, delivered)
+                return {"choices": [{"message": {"content": content}}]}
+            except (requests.RequestException, json.JSONDecodeError) as e:
+                if delivered:
+                    # The caller may already have acted on the partial answer
+                    raise
+                log.warning("API attempt %d failed: %s", attempt + 1, e)
+                if attempt < attempts - 1:
+                    # Exponential backoff: 2, 4, 8, 16, 32, 60, 60 seconds
+                    delay = min(2 ** (attempt + 1), 60)
+                    log.info("  retrying in %ds...", delay)
+                    time.sleep(delay)
+        raise RuntimeError(f"OpenRouter API failed after {attempts} attempts")
@@ -0,0 +1,291 @@
+"""
+Conversation history for the LLM player.
+
+Keeps the recent turns that fit a token budget, compresses older
+observations to one-line summaries and folds finished blocks of turns into
+a running history summary.
+"""
+
+import logging
+import re
+from collections import deque
+from collections.abc import Callable
+
+log = logging.getLogger("llm_player")
+
+# Pull the headline figures out of a format_observation() block.
+_OBS_TURN_RE = re.compile(r"^## Turn (\d+)", re.M)
+_OBS_TREASURY_RE = re.compile(r"^Treasury: (\$-?[\d,]+)", re.M)
+_OBS_POPULATION_RE = re.compile(r"^Population: (\d+)", re.M)
+_OBS_HAPPINESS_RE = re.compile(r"^Happiness: ([\d.]+)", re.M)
+_OBS_FAILED_RE = re.compile(r"^FAILED ACTIONS \(last turn\):\n((?:  - .*(?:\n|$))+)", re.M)
+_OBS_WARNINGS_RE = re.compile(r"^WARNINGS: (.+)$", re.M)
+
+
+def summarize_observation(observation: str) -> str:
+    """Collapse a formatted observation into a one-line headline summary."""
+    fields = []
+    for label, pattern in (
+        ("treasury", _OBS_TREASURY_RE),
+        ("pop", _OBS_POPULATION_RE),
+        ("happiness", _OBS_HAPPINESS_RE),
+    ):
+        match = pattern.search(observation)
+        if match:
+            fields.append(f"{label}={match.group(1)}")
+    failed = _OBS_FAILED_RE.search(observation)
+    if failed:
+        fields.append(f"failed={failed.group(1).count('  - ')}")
+    warnings = _OBS_WARNINGS_RE.search(observation)
+    if warnings:
+        fields.append(f"warnings={warnings.group(1).replace(' ', '')}")
+    turn = _OBS_TURN_RE.search(observation)
+    header = f"[obs turn {turn.group(1)}]" if turn else "[obs]"
+    return " ".join([header, *fields])
+
+
+def elide_repeated_lines(observation: str, latest: str) -> str:
+    """Replace lines of *observation* that recur verbatim in *latest*.
+
+    Static blocks (buildable-area notes, per-warning fix hints, unchanged
+    coverage) repeat every turn; in historical observations each run of
+    them collapses to a single marker pointing at the latest turn.
+    """
+    latest_lines = set(latest.splitlines())
+    out: list[str] = []
+    run = 0
+    for line in observation.splitlines():
+        if line in latest_lines and not line.startswith("## "):
+            run += 1
+            continue
+        if run:
+            out.append(f"[{run} line(s) same as latest turn]")
+            run = 0
+        out.append(line)
+    if run:
+        out.append(f"[{run} line(s) same as latest turn]")
+    return "\n".join(out)
+
+
+# format_observation() lines that make a turn worth keeping in history.
+_ALERT_MARKERS = ("ACTION NEEDED:", "WARNINGS:", "FAILED ACTIONS")
+
+
+def _cached_text(text: str) -> list[dict]:
+    """Wrap *text* as a content block marked as a prompt-cache breakpoint."""
+    return [{"type": "text", "text": text, "cache_control": {"type": "ephemeral"}}]
+
+
+class ConversationManager:
+    """Manages LLM conversation history with summarization.
+
+    With ``prompt_caching`` the static system prompt and the history summary
+    are sent as ``cache_control`` breakpoints, so providers that support
+    prompt caching (Anthropic via OpenRouter) bill and prefill that prefix
+    only once per cache lifetime instead of every turn.
+    """
+
+    def __init__(
+        self, system_prompt: str, prompt_caching: bool = False,
+        recent_obs_keep: int = 1,
+        summarizer: Callable[[str], str] | None = None,
+        max_history_tokens: int = 8000, max_recent_turns: int = 5,
+    ):
+        self.system_prompt = system_prompt
+        # Distills history text into a fresh summary (e.g. a cheap LLM);
+        # without it, a one-line tally per block is appended instead.
+        self.summarizer = summarizer
+        self.prompt_caching = prompt_caching
+        # Historical observations sent verbatim; older ones are summarized.
+        self.recent_obs_keep = recent_obs_keep
+        self.history_summary = ""
+        # Without a summarizer, history_summary only holds the blocks since
+        # the last 50-turn mark; everything before is folded into this one
+        # line, which changes rarely and so stays a cacheable prefix.
+        self.era_summary = ""
+        self._era_actions = self._era_successes = 0
+        # Approximate token budget for verbatim recent turns; when exceeded
+        # the lowest score-per-token turns are dropped (see _retain_turns).
+        self.max_history_tokens = max_history_tokens
+        # Hard cap on recent turns, whatever their size: each one sends its
+        # assistant response verbatim, so many small turns still add up.
+        self.max_recent_turns = max_recent_turns
+        # {"obs", "response", "score", "tokens"} in chronological order
+        self.recent_turns: list[dict] = []
+        # Only the newest entries are needed: older ones are already folded
+        # into history_summary. Action tallies since then are kept running.
+        self.turn_log: deque[dict] = deque(maxlen=20)
+        self._block_actions = 0
+        self._block_successes = 0
+        # (treasury, population, happiness, warnings) seen last turn, and
+        # whether the LLM chose to do nothing then (see play_turn).
+        self.last_state: tuple | None = None
+        self.last_idle = False
+        # Newest raw observation, for metrics when a turn fails part-way
+        self.last_observation: dict = {}
+        # System prompt + history summary messages; rebuilt only when
+        # _compress_history changes the summary, so the prefix stays
+        # byte-identical between compressions (and prompt-cacheable).
+        self._system_messages: list[dict] | None = None
+
+    def build_messages(self, current_observation: str) -> list[dict]:
+        """Build the message list for the LLM API call."""
+        if self._system_messages is None:
+            wrap = _cached_text if self.prompt_caching else str
+            self._system_messages = [{"role": "system", "content": wrap(self.system_prompt)}]
+            if self.era_summary:
+                self._system_messages.append({
+                    "role": "system",
+                    "content": wrap(f"## Your History\n{self.era_summary}"),
+                })
+            if self.history_summary:
+                title = "Recent History" if self.era_summary else "Your History"
+                self._system_messages.append({
+                    "role": "system",
+                    "content": wrap(f"## {title}\n{self.history_summary}"),
+                })
+        messages = list(self._system_messages)
+        recent = [(t["obs"], t["response"]) for t in self.recent_turns]
+        for obs, response in self._progressive_compress(recent, current_observation):
+            messages.append({"role": "user", "content": obs})
+            messages.append({"role": "assistant", "content": response})
+        messages.append({"role": "user", "content": current_observation})
+        return messages
+
+    def _progressive_compress(
+        self, turns: list[tuple[str, str]], current_observation: str,
+    ) -> list[tuple[str, str]]:
+        """Summarize all but the newest ``recent_obs_keep`` observations.
+
+        The ones kept verbatim drop lines repeated in *current_observation*.
+        Works on a copy; ``recent_turns`` always keeps the full text.
+        """
+        cutoff = len(turns) - self.recent_obs_keep
+        return [
+            (
+                summarize_observation(obs) if i < cutoff
+                else elide_repeated_lines(obs, current_observation),
+                response,
+            )
+            for i, (obs, response) in enumerate(turns)
+        ]
+
+    def record_turn(
+        self, turn: int, observation: str, response: str, results: list,
+        treasury: float = 0, population: int = 0, building_count: int = 0,
+    ):
+        """Record a completed turn and compress history periodically."""
+        prev = self.turn_log[-1] if self.turn_log else None
+        self.recent_turns.append({
+            "obs": observation,
+            "response": response,
+            "score": self._turn_score(prev, observation, results, treasury, building_count),
+            "tokens": max(1, (len(observation) + len(response)) // 4),
+        })
+        self._retain_turns()
+        self.turn_log.append({
+            "turn": turn,
+            "results": results,
+            "treasury": treasury,
+            "population": population,
+            "building_count": building_count,
+        })
+        self._block_actions += len(results)
+        self._block_successes += sum(1 for r in results if r.get("success", False))
+        if turn > 0 and turn % 10 == 0:
+            self._compress_history(turn)
+
+    @staticmethod
+    def _turn_score(
+        prev: dict | None, observation: str, results: list, treasury: float,
+        building_count: int,
+    ) -> float:
+        """How much a turn is worth keeping: failures, alerts, growth, money swings."""
+        failed = sum(1 for r in results if not r.get("success", False))
+        # Turns that flagged demand or warnings are what the LLM reacts to
+        alerts = sum(marker in observation for marker in _ALERT_MARKERS)
+        score = 1 + 2 * failed + alerts
+        if prev is None:
+            return score
+        new_buildings = max(0, building_count - prev.get("building_count", 0))
+        treasury_delta = abs(treasury - prev.get("treasury", treasury))
+        return score + 2 * new_buildings + treasury_delta / 1000
+
+    def _retain_turns(self):
+        """Fit ``recent_turns`` into the token budget and turn cap by score per token.
+
+        The newest turn is always kept; the others are admitted greedily in
+        order of ``score / tokens`` while they fit and there are slots left,
+        and the survivors keep their chronological order.
+        """
+        total = sum(t["tokens"] for t in self.recent_turns)
+        if total <= self.max_history_tokens and len(self.recent_turns) <= self.max_recent_turns:
+            return
+        *older, newest = self.recent_turns
+        budget = self.max_history_tokens - newest["tokens"]
+        slots = self.max_recent_turns - 1
+        ranked = sorted(
+            range(len(older)),
+            key=lambda i: (older[i]["score"] / older[i]["tokens"], i),
+            reverse=True,
+        )
+        keep = set()
+        for i in ranked:
+            if not slots:
+                break
+            if older[i]["tokens"] <= budget:
+                keep.add(i)
+                budget -= older[i]["tokens"]
+                slots -= 1
+        self.recent_turns = [t for i, t in enumerate(older) if i in keep] + [newest]
+
+    def _compress_history(self, current_turn: int):
+        """Summarize the last 10 turns into a compact history block."""
+        self._system_messages = None
+        block_start = max(1, current_turn - 9)
+        block = [t for t in self.turn_log if t["turn"] >= block_start]
+        actions_taken, successes = self._block_actions, self._block_successes
+        self._block_actions = self._block_successes = 0
+        failures = actions_taken - successes
+        # Include metrics from last turn in block
+        last = block[-1] if block else {}
+        treasury = last.get("treasury", "?")
+        pop = last.get("population", "?")
+        summary = (
+            f"Turns {block_start}-{current_turn}: "
+            f"{actions_taken} actions ({successes} ok, {failures} failed). "
+            f"Treasury=${treasury}, Pop={pop}."
+        )
+        if self.summarizer is not None:
+            try:
+                distilled = self.summarizer(self._history_text(block))
+            except Exception as e:
+                log.warning("History summarization failed: %s", e)
+            else:
+                # Replace rather than append, so the summary stays bounded
+                self.history_summary = f"{distilled.strip()}\nLatest: {summary}\n"
+                return
+        self._era_actions += actions_taken
+        self._era_successes += successes
+        if current_turn % 50 == 0:
+            self.era_summary = (
+                f"Turns 1-{current_turn}: {self._era_actions} actions "
+                f"({self._era_successes} ok, {self._era_actions - self._era_successes} failed). "
+                f"Treasury=${treasury}, Pop={pop}.\n"
+            )
+            self.history_summary = ""
+        else:
+            self.history_summary += summary + "\n"
+
+    def _history_text(self, block: list[dict]) -> str:
+        """Render the current summary plus *block* of turn_log as plain text."""
+        lines = ["## Previous history", self.history_summary or "(none)", "## Latest turns"]
+        for entry in block:
+            lines.append(
+                f"Turn {entry['turn']}: treasury=${entry['treasury']:,.0f} "
+                f"pop={entry['population']}"
+            )
+            for r in entry.get("results", []):
+                status = "ok" if r.get("success") else f"FAILED {r.get('reason', '')}"
+                lines.append(f"  {r.get('action_summary', '?')} -> {status}")
+        return "\n".join(lines)
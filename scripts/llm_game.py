@@ -0,0 +1,164 @@
+"""
+Subprocess wrapper for the game's --agent mode (newline-framed JSON).
+"""
+
+import logging
+import os
+import subprocess
+import threading
+from collections import deque
+
+from llm_json import json_dumps, json_loads
+
+log = logging.getLogger("llm_player")
+
+
+class GameProcess:
+    """Manages the game subprocess in --agent mode."""
+
+    def __init__(self, binary: str, seed: int | None = None):
+        cmd = [binary, "--agent"]
+        if seed is not None:
+            cmd.extend(["--seed", str(seed)])
+        log.info("Starting game: %s", " ".join(cmd))
+        self.proc = subprocess.Popen(
+            cmd,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+        )
+        # Commands go straight to the pipe fd with os.write: one syscall per
+        # frame instead of a buffered write followed by a flush.
+        self._stdin_fd = self.proc.stdin.fileno()
+        # Ticks of a step+observe already written by prefetch_step_and_observe
+        # whose two responses have not been read yet.
+        self._prefetched_ticks: int | None = None
+        # Drain stderr continuously so a chatty game can't fill the pipe and
+        # block mid-write; the tail is kept to explain a crash.
+        self.stderr_tail: deque[bytes] = deque(maxlen=200)
+        self._stderr_thread = threading.Thread(target=self._drain_stderr, daemon=True)
+        self._stderr_thread.start()
+        # The game sends a "ready" message on startup — consume it so
+        # subsequent send/recv pairs stay aligned.
+        ready = json_loads(self.recv_framed())
+        if ready.get("type") != "ready":
+            raise RuntimeError(f"Expected 'ready' handshake, got: {ready}")
+        log.info("Game ready (protocol v%s)", ready.get("protocol_version", "?"))
+
+    def send(self, command: dict) -> dict:
+        """Send a JSON command and read the JSON response."""
+        self._discard_prefetch()
+        payload = json_dumps(command)
+        log.debug(">>> %s", payload)
+        self.send_framed(payload)
+
+        response_line = self.recv_framed()
+        log.debug("<<< %s", response_line.strip())
+        return json_loads(response_line)
+
+    def send_framed(self, payload: bytes):
+        """Write one newline-terminated frame to the game's stdin."""
+        frame = memoryview(payload + b"\n")
+        while frame:
+            frame = frame[os.write(self._stdin_fd, frame):]
+
+    def recv_framed(self) -> bytes:
+        """Read one newline-terminated frame from the game's stdout.
+
+        Protocol frames are JSON objects; any other stdout line (e.g. an
+        engine log line) is skipped so request/response pairing holds.
+        """
+        while line := self.proc.stdout.readline():
+            if line.startswith(b"{"):
+                return line
+            log.debug("Ignoring non-protocol game output: %.200r", line)
+        self._stderr_thread.join(timeout=1)
+        tail = b"".join(list(self.stderr_tail)[-10:])[-2000:].decode(errors="replace").strip()
+        raise ConnectionError(
+            "Game process closed stdout" + (f"; stderr tail:\n{tail}" if tail else "")
+        )
+
+    def _drain_stderr(self):
+        for line in iter(self.proc.stderr.readline, b""):
+            self.stderr_tail.append(line)
+
+    def observe(self) -> dict:
+        return self.send({"cmd": "observe"})
+
+    def act(self, action: dict) -> dict:
+        return self.send({"cmd": "act", "action": action})
+
+    def batch_act(self, actions: list[dict]) -> dict:
+        return self.send({"cmd": "batch_act", "actions": actions})
+
+    def step(self, ticks: int) -> dict:
+        return self.send({"cmd": "step", "ticks": ticks})
+
+    def send_many(self, commands: list[dict]) -> list[dict]:
+        """Send several commands in one write, then read their responses.
+
+        The game handles commands in order, so pipelining them costs one
+        write syscall and one round trip instead of one per command.
+        """
+        self._discard_prefetch()
+        payload = b"\n".join([json_dumps(c) for c in commands])
+        log.debug(">>> %s", payload)
+        self.send_framed(payload)
+        return [json_loads(self.recv_framed()) for _ in commands]
+
+    def step_and_observe(self, ticks: int) -> tuple[dict, dict]:
+        """Step then observe in one pipelined write.
+
+        Collects the responses of a matching prefetch_step_and_observe
+        instead when one is outstanding. Returns (step response, observe
+        response).
+        """
+        if self._prefetched_ticks == ticks:
+            self._prefetched_ticks = None
+            return json_loads(self.recv_framed()), json_loads(self.recv_framed())
+        step, obs = self.send_many([{"cmd": "step", "ticks": ticks}, {"cmd": "observe"}])
+        return step, obs
+
+    def prefetch_step_and_observe(self, ticks: int):
+        """Start the next step+observe now and collect it later.
+
+        The game simulates while the caller finishes its own bookkeeping;
+        the two small responses wait in the pipe until step_and_observe
+        reads them. Any other command discards them first.
+        """
+        self._discard_prefetch()
+        self.send_framed(
+            json_dumps({"cmd": "step", "ticks": ticks}) + b"\n"
+            + json_dumps({"cmd": "observe"})
+        )
+        self._prefetched_ticks = ticks
+
+    def _discard_prefetch(self):
+        if self._prefetched_ticks is not None:
+            self._prefetched_ticks = None
+            self.recv_framed()
+            self.recv_framed()
+
+    def new_game(self, seed: int) -> dict:
+        return self.send({"cmd": "new_game", "seed": seed})
+
+    def save_replay(self, path: str) -> dict:
+        return self.send({"cmd": "save_replay", "path": path})
+
+    def quit(self):
+        try:
+            self.send({"cmd": "quit"})
+        except (ConnectionError, BrokenPipeError):
+            pass
+        try:
+            self.proc.terminate()
+            self.proc.wait(timeout=5)
+        except Exception:
+            self.proc.kill()
+        self._stderr_thread.join(timeout=1)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.quit()
@@ -0,0 +1,223 @@
+"""
+JSON helpers shared by the LLM scripts (llm_player.py, e2e_smoke_test.py).
+
+Fast (de)serialization with optional orjson, JSON embedded in LLM prose,
+OpenRouter SSE streams, and the incremental parser that executes actions
+while a streamed answer is still arriving.
+"""
+
+import json
+import logging
+import re
+from collections.abc import Callable
+
+import requests
+
+try:
+    import orjson  # optional: faster JSON for the game pipe and LLM calls
+except ImportError:
+    orjson = None
+
+log = logging.getLogger("llm_json")
+
+# Action commands the game's --agent mode accepts, roads first
+ACTION_TYPES = (
+    "PlaceRoadLine", "ZoneRect", "PlaceUtility", "PlaceService",
+    "BulldozeRect", "SetTaxRates",
+)
+_ACTION_TYPE_SET = frozenset(ACTION_TYPES)
+
+
+def json_dumps(obj) -> bytes:
+    """Serialize *obj* to compact JSON bytes, using orjson when available."""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, separators=(",", ":")).encode()
+
+
+# json.loads accepts bytes too, and orjson.JSONDecodeError subclasses
+# json.JSONDecodeError, so callers catch the same exception either way.
+json_loads = orjson.loads if orjson is not None else json.loads
+
+
+def is_action(value) -> bool:
+    """True for an action object: a dict with a single known action key."""
+    return (
+        isinstance(value, dict) and len(value) == 1
+        and next(iter(value)) in _ACTION_TYPE_SET
+    )
+
+
+# ---------------------------------------------------------------------------
+# JSON embedded in prose
+# ---------------------------------------------------------------------------
+
+_JSON_DECODER = json.JSONDecoder()
+_JSON_START_RE = re.compile(r"[\[{]")
+
+
+def iter_json_values(text: str, nested: bool = False):
+    """Yield every JSON array/object that starts at a bracket in *text*.
+
+    Each candidate is decoded in place with ``raw_decode``, so prose,
+    markdown fences and trailing chatter never need stripping. By default
+    the scan resumes past each decoded value; with *nested* the values
+    inside it are yielded too (after their parent), which lets callers pick
+    an inner list out of an unexpected wrapper object.
+    """
+    idx = 0
+    while (match := _JSON_START_RE.search(text, idx)) is not None:
+        try:
+            value, end = _JSON_DECODER.raw_decode(text, match.start())
+        except json.JSONDecodeError:
+            idx = match.start() + 1
+            continue
+        idx = match.start() + 1 if nested else end
+        yield value
+
+
+# ---------------------------------------------------------------------------
+# Streamed answers
+# ---------------------------------------------------------------------------
+
+def read_sse_content(
+    resp: requests.Response, on_delta: Callable[[str], None],
+    delivered: list[str],
+) -> str:
+    """Consume an OpenRouter SSE stream, forwarding each content delta.
+
+    Delivered chunks are appended to *delivered*, which also lets the
+    caller tell whether a failed stream had already produced output.
+    """
+    with resp:
+        for line in resp.iter_lines():
+            # Skip blank separators and ": keepalive" comment lines
+            if not line.startswith(b"data:"):
+                continue
+            data = line[5:].strip()
+            if data == b"[DONE]":
+                break
+            choices = json_loads(data).get("choices") or [{}]
+            delta = choices[0].get("delta", {}).get("content")
+            if delta:
+                delivered.append(delta)
+                on_delta(delta)
+    return "".join(delivered)
+
+
+# Stacks of (bracket, member key) at which an opening brace starts an action
+_TURNS_PATH = [("{", None), ("[", "turns")]
+_TURN_ARRAY_PATH = _TURNS_PATH + [("[", None)]
+_ACTIONS_PATH = [("{", None), ("[", "actions")]
+_FLAT_PATH = [("[", None)]
+
+
+class ActionStream:
+    """Incrementally peel complete action objects out of a streamed answer.
+
+    Understands ``{"turns": [[{...}, ...], ...]}``, ``{"actions": [{...}]}``
+    and a flat top-level ``[{...}, ...]`` array. Every action object that
+    closed since the last :meth:`feed` is passed to *on_action* as
+    ``(turn_index, action)`` and kept, as parsed, in :attr:`actions`.
+
+    The open containers are tracked together with the member key each was
+    opened under, so objects under any other key (e.g. a ``"reasoning"``
+    list) are never emitted and brackets in prose around the JSON never
+    shift the turn index. Actions of turns past *max_turns* are dropped.
+    """
+
+    def __init__(self, on_action: Callable[[int, dict], None], max_turns: int = 1):
+        self.on_action = on_action
+        self.max_turns = max_turns
+        self.actions: list[list[dict]] = [[] for _ in range(max_turns)]
+        self._buf = ""
+        self._pos = 0
+        self._stack: list[tuple[str, str | None]] = []
+        self._key: str | None = None  # key of the member value that follows
+        self._last_string = ""
+        self._string_start = 0
+        self._object_start = 0  # where the action object being read starts
+        self._turn = -1
+        self._in_string = False
+        self._escaped = False
+
+    def feed(self, chunk: str):
+        self._buf += chunk
+        buf = self._buf
+        stack = self._stack
+        while self._pos < len(buf):
+            ch = buf[self._pos]
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif ch == "\\":
+                    self._escaped = True
+                elif ch == '"':
+                    self._in_string = False
+                    self._last_string = buf[self._string_start + 1:self._pos]
+            elif ch == '"':
+                self._in_string = True
+                self._string_start = self._pos
+            elif ch == ":":
+                self._key = self._last_string
+            elif ch == ",":
+                self._key = None
+            elif ch in "{[":
+                if ch == "{" and self._action_turn() is not None:
+                    self._object_start = self._pos
+                elif ch == "[" and stack == _TURNS_PATH:
+                    self._turn += 1
+                stack.append((ch, self._key if stack and stack[-1][0] == "{" else None))
+                if stack == _TURNS_PATH:
+                    self._turn = -1
+                self._key = None
+            elif ch in "}]" and stack:
+                bracket, _ = stack.pop()
+                turn = self._action_turn()
+                if bracket == "{" and turn is not None:
+                    self._emit(turn, buf[self._object_start:self._pos + 1])
+                self._key = None
+            self._pos += 1
+
+    def _action_turn(self) -> int | None:
+        """Turn index of an object opened at the current depth, if an action."""
+        if self._stack == _TURN_ARRAY_PATH:
+            return self._turn
+        if self._stack == _ACTIONS_PATH or self._stack == _FLAT_PATH:
+            return 0
+        return None
+
+    def _emit(self, turn: int, text: str):
+        if turn >= self.max_turns:
+            return
+        try:
+            action = json_loads(text)
+        except ValueError:
+            return
+        self.actions[turn].append(action)
+        # on_action may modify its action in place; the copy kept above
+        # still matches the final parse of the same text
+        self.on_action(turn, json_loads(text))
+
+
+def unstreamed_actions(actions: list, streamed: list[dict]) -> list:
+    """Return the parsed *actions* not already executed while streaming.
+
+    Streamed actions are matched by value against the final parse, so the
+    stream and the parser disagreeing never runs an action twice or
+    silently skips one.
+    """
+    if not streamed:
+        return actions
+    unmatched = list(streamed)
+    remaining = []
+    for action in actions:
+        try:
+            unmatched.remove(action)
+        except ValueError:
+            remaining.append(action)
+    if unmatched:
+        log.warning(
+            "%d streamed action(s) missing from the final answer", len(unmatched),
+        )
+    return remaining
@@ -0,0 +1,241 @@
+"""
+Map geometry for the LLM player.
+
+Parses the overview map into a water grid and a buildable-area hint,
+computes the grid cells actions touch, and holds the per-session
+SessionState trackers built from the game's feedback.
+"""
+
+import functools
+import re
+from collections.abc import Iterator
+from dataclasses import dataclass, field
+
+
+def parse_overview_map(overview_map: str) -> list:
+    """Parse overview map string into grid lines (64 strings, each char = 4x4 block)."""
+    if not overview_map:
+        return []
+    lines = overview_map.strip().split("\n")
+    grid_lines = []
+    for line in lines[1:]:  # skip column header
+        if not line.strip():
+            break  # stop at legend separator
+        if "|" in line:
+            _, _, content = line.partition("|")
+            grid_lines.append(content.rstrip())
+    return grid_lines
+
+
+class WaterGrid:
+    """Known-water mask over the 256x256 grid, one byte per cell.
+
+    Supports the ``in``/``add``/``len`` subset of a coordinate set, plus
+    ``mark_rect`` which fills whole row slices at once. Coordinates off
+    the grid are never water.
+    """
+
+    SIZE = 256
+
+    def __init__(self):
+        self.cells = bytearray(self.SIZE * self.SIZE)
+        self._marked = False
+
+    def __contains__(self, coord) -> bool:
+        x, y = coord
+        size = self.SIZE
+        return 0 <= x < size and 0 <= y < size and self.cells[y * size + x] == 1
+
+    def __bool__(self) -> bool:
+        return self._marked
+
+    def __len__(self) -> int:
+        return self.cells.count(1)
+
+    def add(self, coord):
+        self.mark_rect(coord[0], coord[1], coord[0], coord[1])
+
+    def any_in_rect(self, x0: int, y0: int, x1: int, y1: int) -> bool:
+        """Whether any cell of the inclusive rectangle, clipped to the grid, is water."""
+        size = self.SIZE
+        x0, y0 = max(x0, 0), max(y0, 0)
+        x1, y1 = min(x1, size - 1), min(y1, size - 1)
+        if x0 > x1 or y0 > y1:
+            return False
+        cells = self.cells
+        if x0 == x1:
+            # A column is one strided slice
+            return 1 in cells[y0 * size + x0 : y1 * size + x0 + 1 : size]
+        return any(1 in cells[y * size + x0 : y * size + x1 + 1] for y in range(y0, y1 + 1))
+
+    def mark_rect(self, x0: int, y0: int, x1: int, y1: int):
+        """Mark the inclusive rectangle (x0,y0)-(x1,y1), clipped to the grid."""
+        size = self.SIZE
+        x0, y0 = max(x0, 0), max(y0, 0)
+        x1, y1 = min(x1, size - 1), min(y1, size - 1)
+        if x0 > x1 or y0 > y1:
+            return
+        run = b"\x01" * (x1 - x0 + 1)
+        for y in range(y0, y1 + 1):
+            self.cells[y * size + x0 : y * size + x1 + 1] = run
+        self._marked = True
+
+
+_WATER_RUN_RE = re.compile(r"~+")
+
+
+def build_water_grid(grid_lines: list) -> WaterGrid:
+    """Build the known-water grid from parsed overview map lines."""
+    water = WaterGrid()
+    scale = 4  # overview is 64x64 for 256x256 grid
+    for oy, row in enumerate(grid_lines):
+        # Each horizontal run of water tiles becomes one rectangle
+        for m in _WATER_RUN_RE.finditer(row):
+            water.mark_rect(
+                m.start() * scale, oy * scale,
+                m.end() * scale - 1, oy * scale + scale - 1,
+            )
+    return water
+
+
+def compute_buildable_area(grid_lines: list) -> str:
+    """Find safe buildable area from parsed overview grid lines."""
+    if not grid_lines:
+        return ""
+
+    # Find bounds of buildable (non-water) cells
+    # Per row, stripping water and padding off both ends gives the first and
+    # last buildable column without visiting cells one by one.
+    min_x, min_y = 999, 999
+    max_x, max_y = 0, 0
+    for y, row in enumerate(grid_lines):
+        right = row.rstrip("~ ")
+        if not right:
+            continue
+        min_x = min(min_x, len(row) - len(row.lstrip("~ ")))
+        max_x = max(max_x, len(right) - 1)
+        if min_y == 999:
+            min_y = y
+        max_y = y
+    if min_x > max_x:
+        return ""
+    # Scale from overview coords (64x64) to grid coords (256x256)
+    scale = 4
+    gx0, gy0 = min_x * scale, min_y * scale
+    gx1, gy1 = (max_x + 1) * scale - 1, (max_y + 1) * scale - 1
+    # Clamp to grid bounds
+    gx0 = max(0, min(gx0, 255))
+    gy0 = max(0, min(gy0, 255))
+    gx1 = max(0, min(gx1, 255))
+    gy1 = max(0, min(gy1, 255))
+    # Find a safe center point (well away from water edges)
+    margin = 5 * scale  # 5 overview cells = 20 grid cells margin
+    sx0, sy0 = gx0 + margin, gy0 + margin
+    sx1, sy1 = gx1 - margin, gy1 - margin
+    cx, cy = (sx0 + sx1) // 2, (sy0 + sy1) // 2
+    # Cap center to safe range
+    cx = max(sx0, min(cx, sx1))
+    cy = max(sy0, min(cy, sy1))
+    return (f"Buildable land: ({sx0},{sy0}) to ({sx1},{sy1}). Center: ({cx},{cy}). "
+            f"Build roads starting near the center. "
+            f"NOTE: Rivers/lakes exist INSIDE this area — if you hit water, try a different direction.")
+
+
+@dataclass(slots=True)
+class SessionState:
+    """Trackers built from the game's feedback during one session.
+
+    run_session makes a fresh instance per session and passes it to the
+    helpers that read or update it.
+    """
+
+    buildable_area_info: str = ""  # buildable-area hint, computed on turn 1
+    # Known water grid cells — built from overview map + runtime failures
+    water_cells: WaterGrid = field(default_factory=WaterGrid)
+    # Track consecutive water failures to help LLM change direction
+    water_fail_positions: list = field(default_factory=list)
+    consecutive_water_turns: int = 0
+    # (len(water_fail_positions), text of its last 10 entries); the list only
+    # grows within a session, so its length tells when the text is stale
+    water_hits_text: tuple = (0, "")
+    prev_treasury: float = 50000.0  # track previous turn treasury for delta
+    last_treasury_delta: float = 0.0  # saved delta for use in action filtering
+    placed_positions: set = field(default_factory=set)  # positions where things were successfully placed
+    last_tax_rates: tuple = ()  # last applied SetTaxRates, as floats in TAX_KEYS order
+    # Road cells with nothing placed on them yet, for fallback utility placement;
+    # kept up to date as roads and placements succeed instead of recomputed
+    available_road: set = field(default_factory=set)
+    next_road_y: int = 95  # next Y for auto-road expansion (starts after typical initial roads)
+    water_tower_positions: list = field(default_factory=list)  # WaterTower positions for spatial spreading
+
+
+# Coordinate parameters per action type; unknown types check all of them.
+COORD_KEYS = ("start", "end", "pos", "min", "max")
+_ACTION_COORD_KEYS = {
+    "PlaceRoadLine": ("start", "end"),
+    "ZoneRect": ("min", "max"),
+    "BulldozeRect": ("min", "max"),
+    "PlaceUtility": ("pos",),
+    "PlaceService": ("pos",),
+    "SetTaxRates": (),
+}
+
+
+def iter_action_cells(action: dict) -> Iterator[tuple[int, int, int, int]]:
+    """Grid cells an action touches, as inclusive (x0, y0, x1, y1) boxes.
+
+    Every coordinate parameter is a one-cell box; a straight road line is
+    also one box covering all its intermediate cells, so callers test or
+    mark a whole line with slice operations instead of cell by cell.
+    Boxes are yielded lazily so ``any()`` callers stop at the first hit.
+    """
+    for key, params in action.items():
+        if isinstance(params, dict):
+            for ck in _ACTION_COORD_KEYS.get(key, COORD_KEYS):
+                v = params.get(ck)
+                if isinstance(v, list) and len(v) >= 2:
+                    x, y = int(v[0]), int(v[1])
+                    yield x, y, x, y
+            # For road lines, include intermediate points
+            start = params.get("start")
+            end = params.get("end")
+            if isinstance(start, list) and isinstance(end, list):
+                x0, y0 = int(start[0]), int(start[1])
+                x1, y1 = int(end[0]), int(end[1])
+                if x0 == x1 or y0 == y1:  # vertical or horizontal
+                    yield min(x0, x1), min(y0, y1), max(x0, x1), max(y0, y1)
+
+
+@functools.lru_cache(maxsize=1024)
+def road_line_cells(x0: int, y0: int, x1: int, y1: int) -> frozenset:
+    """Cells covered by a straight road line (empty for a diagonal one).
+
+    Cached because the LLM often re-sends the same lines turn after turn.
+    """
+    if x0 == x1:
+        return frozenset((x0, y) for y in range(min(y0, y1), max(y0, y1) + 1))
+    if y0 == y1:
+        return frozenset((x, y0) for x in range(min(x0, x1), max(x0, x1) + 1))
+    return frozenset()
+
+
+def action_hits_water(action: dict, water_cells: WaterGrid) -> bool:
+    """Check if any coordinate of this action is in known water."""
+    if not water_cells:
+        return False
+    return any(water_cells.any_in_rect(*box) for box in iter_action_cells(action))
+
+
+def action_out_of_bounds(action: dict) -> bool:
+    """Check if any coordinate of this action is outside the 256x256 grid."""
+    return any(
+        x0 < 0 or x1 >= 256 or y0 < 0 or y1 >= 256
+        for x0, y0, x1, y1 in iter_action_cells(action)
+    )
+
+
+def record_water_failure(action: dict, water_cells: WaterGrid):
+    """Mark coordinates from a water-blocked action as water."""
+    for x0, y0, x1, y1 in iter_action_cells(action):
+        # Also mark surrounding cells as likely water (water comes in patches)
+        water_cells.mark_rect(x0 - 2, y0 - 2, x1 + 2, y1 + 2)
@@ -0,0 +1,237 @@
+"""
+Render game observations and layer queries as prompt text.
+"""
+
+import json
+
+from llm_map import SessionState
+
+
+# Static remediation lines appended after the WARNINGS line, per warning.
+_WARNING_FIXES = {
+    "PowerShortage": (
+        "  FIX: Place more PowerPlant utilities ON road cells! (PlaceUtility with utility_type=PowerPlant)",
+    ),
+    "WaterShortage": (
+        "  FIX: Place more WaterTower utilities ON road cells! (PlaceUtility with utility_type=WaterTower)",
+        "  NOTE: WaterTower is the utility. WaterTreatmentPlant is a different thing (service for wastewater).",
+    ),
+    "HighUnemployment": (
+        "  FIX: Zone more Commercial, Industrial, or Office areas for jobs!",
+    ),
+    "HighHomelessness": (
+        "  FIX: Zone more ResidentialLow or ResidentialMedium areas!",
+    ),
+}
+
+
+def format_observation(obs: dict, state: SessionState, turn: int = 0) -> str:
+    """Format a city observation into a compact summary for the LLM."""
+    parts = [f"## Turn {turn}"]
+
+    # Economy
+    treasury = obs.get("treasury", 0)
+    income = obs.get("monthly_income", 0)
+    expenses = obs.get("monthly_expenses", 0)
+    est_income = obs.get("estimated_monthly_income", 0)
+    est_expenses = obs.get("estimated_monthly_expenses", 0)
+    # Use estimated values when actual monthly values haven't been computed yet
+    show_income = income if income > 0 else est_income
+    show_expenses = expenses if expenses > 0 else est_expenses
+    # Show actual treasury change per turn (includes hidden trade costs)
+    delta = treasury - state.prev_treasury
+    state.prev_treasury = treasury
+    state.last_treasury_delta = delta  # save for action filtering
+    parts.append(f"Treasury: ${treasury:,.0f} (change: ${delta:+,.0f}/turn) | Income: ${show_income:,.0f}/mo | Expenses: ${show_expenses:,.0f}/mo")
+    if delta < -5000:
+        parts.append(f"*** MONEY DRAIN: Lost ${abs(delta):,.0f} this turn from goods imports! Zone more Industrial to produce locally. ***")
+    if delta < -3000 and treasury < 50000:
+        parts.append(f"*** SLOW DOWN: Stop building new zones until treasury stabilizes! Only place utilities and Industrial zones. ***")
+    if treasury < 5000:
+        parts.append(f"*** LOW FUNDS: Only ${treasury:,.0f} left! Do NOT place buildings/utilities/services. Only zone (free) or set taxes. ***")
+    if show_expenses > show_income and show_expenses > 0:
+        deficit = show_expenses - show_income
+        months_left = treasury / deficit if deficit > 0 and treasury > 0 else 0
+        if treasury > 0 and months_left < 12:
+            parts.append(f"WARNING: Running a deficit of ${deficit:,.0f}/mo — bankruptcy in ~{months_left:.0f} months!")
+        elif treasury < 0:
+            parts.append(f"CRITICAL: BANKRUPT! Treasury is negative. RAISE TAXES immediately or cut spending!")
+
+    # Population
+    pop = obs.get("population", {})
+    total = pop.get("total", 0)
+    employed = pop.get("employed", 0)
+    unemployed = pop.get("unemployed", 0)
+    homeless = pop.get("homeless", 0)
+    parts.append(f"Population: {total} | Employed: {employed} | Unemployed: {unemployed} | Homeless: {homeless}")
+
+    # Happiness with breakdown
+    hap = obs.get("happiness", {})
+    happiness = hap.get("overall", 0)
+    components = hap.get("components", [])
+    parts.append(f"Happiness: {happiness:.1f}/100")
+    if components:
+        # Show top negative factors so LLM knows what to fix
+        negatives, positives = [], []
+        for name, val in components:
+            if val < -1:
+                negatives.append((name, val))
+            elif val > 1:
+                positives.append((name, val))
+        if negatives:
+            negatives.sort(key=lambda x: x[1])
+            neg_strs = [f"{name}={val:+.1f}" for name, val in negatives[:5]]
+            parts.append(f"  Biggest drags: {', '.join(neg_strs)}")
+        if positives:
+            positives.sort(key=lambda x: -x[1])
+            pos_strs = [f"{name}={val:+.1f}" for name, val in positives[:3]]
+            parts.append(f"  Top positives: {', '.join(pos_strs)}")
+
+    # Coverage (infrastructure + services)
+    power_cov = obs.get("power_coverage", 0)
+    water_cov = obs.get("water_coverage", 0)
+    svcs = obs.get("services", {})
+    parts.append(
+        f"Coverage -- Power: {power_cov:.0%} | Water: {water_cov:.0%} | "
+        f"Fire: {svcs.get('fire', 0):.0%} | Police: {svcs.get('police', 0):.0%} | "
+        f"Health: {svcs.get('health', 0):.0%} | Education: {svcs.get('education', 0):.0%}"
+    )
+    # Highlight critical utility needs
+    if power_cov < 0.8:
+        parts.append(f"  >>> NEED PowerPlant! Power coverage is only {power_cov:.0%}. Place PlaceUtility with utility_type=PowerPlant ON a road.")
+    if water_cov < 0.8:
+        parts.append(f"  >>> NEED WaterTower! Water coverage is only {water_cov:.0%}. Place PlaceUtility with utility_type=WaterTower ON a road.")
+
+    # Buildings and attractiveness
+    bldgs = obs.get("building_count", 0)
+    attract = obs.get("attractiveness_score", 0)
+    parts.append(f"Buildings: {bldgs} | Attractiveness: {attract:.1f}/100 (need >60 for immigration)")
+
+    # Attractiveness breakdown (if available)
+    attr_bd = obs.get("attractiveness", {})
+    if attr_bd:
+        parts.append(
+            f"  Attract breakdown -- Employment: {attr_bd.get('employment', 0):.0%} | "
+            f"Happiness: {attr_bd.get('happiness', 0):.0%} | "
+            f"Services: {attr_bd.get('services', 0):.0%} | "
+            f"Housing: {attr_bd.get('housing', 0):.0%} | "
+            f"Tax: {attr_bd.get('tax', 0):.0%}"
+        )
+
+    # Zone demand with explicit guidance (values are 0.0-1.0 floats)
+    zd = obs.get("zone_demand", {})
+    r_dem = zd.get("residential", 0)
+    c_dem = zd.get("commercial", 0)
+    i_dem = zd.get("industrial", 0)
+    o_dem = zd.get("office", 0)
+    parts.append(f"Demand -- R:{r_dem:.0%} C:{c_dem:.0%} I:{i_dem:.0%} O:{o_dem:.0%}")
+    # Highlight high-demand zones the LLM should prioritize
+    high_demand = []
+    if c_dem > 0.5:
+        high_demand.append(f"Commercial ({c_dem:.0%})")
+    if i_dem > 0.5:
+        high_demand.append(f"Industrial ({i_dem:.0%})")
+    if o_dem > 0.5:
+        high_demand.append(f"Office ({o_dem:.0%})")
+    if r_dem > 0.5:
+        high_demand.append(f"Residential ({r_dem:.0%})")
+    if high_demand:
+        parts.append(f"ACTION NEEDED: High demand for {', '.join(high_demand)} — zone these to grow!")
+
+    # Recent action results (from game engine)
+    recent_results = obs.get("recent_action_results", [])
+    failed_results = [r for r in recent_results if not r.get("success", True)]
+    if failed_results:
+        parts.append("FAILED ACTIONS (last turn):")
+        for r in failed_results[-5:]:
+            parts.append(f"  - {r.get('action_summary', '?')}")
+
+    # Warnings with specific remediation
+    warnings = obs.get("warnings", [])
+    if warnings:
+        parts.append(f"WARNINGS: {', '.join(warnings)}")
+        # Give SPECIFIC fix instructions per warning
+        for w in warnings:
+            parts.extend(_WARNING_FIXES.get(w, ()))
+
+    # Proactive hints based on happiness breakdown
+    if total > 50 and components:
+        component_dict = dict(components)
+        tips = []
+        if component_dict.get("garbage", 0) < -3:
+            tips.append("Place Landfill (fixes garbage={:.0f})".format(component_dict["garbage"]))
+        if component_dict.get("health", 0) < -10:
+            tips.append("Place WaterTreatmentPlant + Cemetery as SERVICES (fixes health={:.0f})".format(component_dict["health"]))
+        if component_dict.get("crime", 0) < -3:
+            tips.append("Place PoliceStation (fixes crime={:.0f})".format(component_dict["crime"]))
+        if component_dict.get("noise", 0) < -3:
+            tips.append("Place SmallPark between zones")
+        if tips:
+            parts.append("FIX HAPPINESS: " + " | ".join(tips))
+
+    # Buildable area (cached from terrain query)
+    if state.buildable_area_info:
+        parts.append(state.buildable_area_info)
+
+    # Water failure tracking
+    water_fails = state.water_fail_positions
+    if water_fails:
+        total_water_fails = len(water_fails)
+        if total_water_fails > 3:
+            # Show water-blocked regions so LLM avoids them
+            if state.water_hits_text[0] != total_water_fails:
+                recent = water_fails[-10:]
+                state.water_hits_text = (total_water_fails, ", ".join(f"({x},{y})" for x, y in recent))
+            coords_str = state.water_hits_text[1]
+            parts.append(
+                f"WATER BLOCKED: {total_water_fails} total failures. Recent water hits: {coords_str}. "
+                f"AVOID these areas — they are rivers/lakes."
+            )
+    if state.consecutive_water_turns >= 2:
+        if water_fails:
+            avg_x = sum(p[0] for p in water_fails[-6:]) // min(6, len(water_fails))
+            avg_y = sum(p[1] for p in water_fails[-6:]) // min(6, len(water_fails))
+            parts.append(
+                f"WARNING: You hit water {state.consecutive_water_turns} turns in a row near ({avg_x},{avg_y})! "
+                f"STOP building in this direction. Expand in a DIFFERENT direction."
+            )
+
+    return "\n".join(parts)
+
+
+LAYER_TEXT_LIMIT = 3000
+_LAYER_ENCODER = json.JSONEncoder(indent=2)
+
+
+def _truncated_json(data, limit: int = LAYER_TEXT_LIMIT) -> str:
+    """Pretty-print *data* as JSON, stopping once *limit* chars are produced.
+
+    Same text as ``json.dumps(data, indent=2)[:limit]``, but large layers
+    are encoded incrementally instead of being rendered in full first.
+    """
+    chunks = []
+    size = 0
+    for chunk in _LAYER_ENCODER.iterencode(data):
+        chunks.append(chunk)
+        size += len(chunk)
+        if size >= limit:
+            break
+    return "".join(chunks)[:limit]
+
+
+def format_layers(layer_response: dict) -> str:
+    """Format query layer responses into text for the LLM."""
+    parts = ["## Layer Query Results"]
+    layers = layer_response.get("layers", layer_response)
+    if isinstance(layers, dict):
+        for name, data in layers.items():
+            parts.append(f"\n### {name}")
+            if isinstance(data, str):
+                parts.append(data)
+            else:
+                parts.append(_truncated_json(data))
+    elif isinstance(layers, str):
+        parts.append(layers)
+    else:
+        parts.append(str(layers)[:LAYER_TEXT_LIMIT])
+    return "\n".join(parts)
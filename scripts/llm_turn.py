@@ -0,0 +1,273 @@
+"""
+One turn of the LLM player: observe, ask the LLM, execute the answer.
+"""
+
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from llm_actions import generate_fallback_actions, inject_critical_utilities, parse_response
+from llm_cache import SemanticCache
+from llm_client import LLMClient
+from llm_conversation import ConversationManager
+from llm_game import GameProcess
+from llm_json import ActionStream, unstreamed_actions
+from llm_map import SessionState, build_water_grid, compute_buildable_area, parse_overview_map
+from llm_observation import format_layers, format_observation
+from llm_turn_actions import TurnActions
+
+log = logging.getLogger("llm_player")
+
+# Stand-in LLM answer for turns skipped because nothing changed.
+IDLE_RESPONSE = '{"actions": []}'
+# A session ends after the turn whose observed treasury is below this.
+BANKRUPT_TREASURY = -100_000
+
+SYSTEM_PROMPT = """\
+You are playing Megacity, a 256x256 grid city builder. Each turn you receive stats and respond with JSON actions.
+
+## CRITICAL RULES
+1. People need BOTH housing AND jobs. Zone Residential AND Commercial/Industrial every turn.
+2. Utilities MUST be ON a road cell. Utilities on grass = zero coverage.
+3. If you get BlockedByWater errors, STOP going that direction. Try north, south, or west instead.
+4. Use LARGE zone rects (e.g. 5x10) not tiny 1x1 zones. More zones = more buildings = more people.
+5. NEVER lower taxes below 8%. Low taxes = no income = bankruptcy. Keep all tax rates at 8-12%.
+6. Watch the zone demand numbers! If Commercial/Industrial/Office demand is high, zone those types.
+7. NEVER place things at the same position twice — each new building/utility/service needs a UNIQUE position.
+8. Each turn, place buildings at NEW coordinates you haven't used before.
+
+## Building Pattern — ROAD GRID
+Water and power only reach 1 cell from roads. Zone rects more than 1 cell from a road get NO utilities!
+
+Build a GRID of roads spaced 3 cells apart, then zone the 1-cell gaps between roads:
+1. Build horizontal road: (100,80)→(120,80)
+2. Build parallel road: (100,83)→(120,83)  ← 3 cells south
+3. Zone the 2 rows between: (100,81)-(120,82)  ← only 2 cells deep, both adjacent to a road!
+4. Build cross-roads: (100,80)→(100,83), (110,80)→(110,83), (120,80)→(120,83)
+
+Example turn 1: Road (100,80)→(120,80), PowerPlant@(105,80), WaterTower@(110,80), zone ResLow (100,81)-(120,82).
+Example turn 2: Road (100,83)→(120,83), WaterTower@(105,83), zone ComLow (100,81)-(120,82), zone Industrial (100,84)-(120,85).
+Example turn 3: Cross-roads (100,80)→(100,86), (110,80)→(110,86), (120,80)→(120,86). Zone Office (101,84)-(109,85).
+
+KEY RULES:
+- Zone rects should be MAX 2 cells deep (1 cell on each side of a road)
+- Build a GRID pattern, not just parallel lines — connect roads with cross-roads
+- Each turn, use DIFFERENT coordinates than previous turns
+- Build CLOSE to existing development (within 20 cells)
+
+## Actions (respond with ONLY a JSON object, no other text)
+{"actions": [
+  {"PlaceRoadLine": {"start": [x,y], "end": [x,y], "road_type": "Local"}},
+  {"ZoneRect": {"min": [x,y], "max": [x,y], "zone_type": "ResidentialLow"}},
+  {"PlaceUtility": {"pos": [x,y], "utility_type": "PowerPlant"}},
+  {"PlaceService": {"pos": [x,y], "service_type": "FireStation"}},
+  {"SetTaxRates": {"residential": 0.09, "commercial": 0.09, "industrial": 0.09, "office": 0.09}}
+]}
+
+## Zone Types
+ResidentialLow, ResidentialMedium, ResidentialHigh, CommercialLow, CommercialHigh, Industrial, Office, MixedUse
+
+## Utilities — provide COVERAGE (MUST be ON road cells!)
+- PowerPlant ($1000) → provides POWER to nearby buildings (range 30)
+- WaterTower ($200) → provides WATER to nearby buildings (range 25)
+IMPORTANT: You need BOTH PowerPlant AND WaterTower for buildings to grow!
+Place one of each every few turns as you expand.
+
+## Services (place ON or near road cells)
+Services do NOT provide power or water. They improve happiness and health.
+### Essential (place 1-2 per turn as city grows):
+FireStation ($800), PoliceStation ($600), Hospital ($2000), ElementarySchool ($2000), HighSchool ($1500)
+### Health services (place early to avoid happiness penalties):
+Landfill ($300) — garbage collection
+WaterTreatmentPlant ($1500) — wastewater (NOT the same as WaterTower!)
+Cemetery ($400) — death care
+### Nice to have:
+SmallPark ($200), RecyclingCenter ($800), Library ($500)
+
+## Key Facts
+- Buildings need POWER (from PowerPlant) AND WATER (from WaterTower) to grow
+- WaterTower = WATER COVERAGE utility. WaterTreatmentPlant = health SERVICE. Different things!
+- Zone rects must be adjacent to a road (within 2 cells)
+- Water (~) on the map is unbuildable terrain (rivers/lakes)
+- Starting treasury: $50,000
+- Commercial buildings IMPORT goods (costs money!). Industrial PRODUCE goods. Balance them.
+- If treasury drops fast, zone MORE Industrial to reduce import costs.
+"""
+
+# Which coordinate of a water-blocked action is reported back to the LLM
+_WATER_FAIL_COORD_KEYS = {
+    "PlaceRoadLine": "start",
+    "PlaceUtility": "pos",
+    "PlaceService": "pos",
+    "ZoneRect": "min",
+    "BulldozeRect": "min",
+}
+
+
+def play_turn(
+    game: GameProcess,
+    llm: LLMClient,
+    conv_mgr: ConversationManager,
+    state: SessionState,
+    turn: int,
+    ticks_per_turn: int,
+    semantic_cache: SemanticCache | None = None,
+    stream_llm: bool = False,
+    overlap_step: bool = False,
+    prefetch_next: bool = False,
+) -> tuple:
+    """Execute a single game turn with optional query phase.
+
+    With *stream_llm* the LLM answer is streamed and each action is
+    filtered and executed as soon as its JSON object is complete.
+
+    With *overlap_step* the simulation steps while the LLM is thinking
+    instead of before the observation, so the actions land on a state
+    one step newer than the one the LLM saw.
+
+    With *prefetch_next* the next turn's step+observe is sent as soon as
+    the actions are in, so the game simulates during history bookkeeping;
+    it is skipped on a turn that ends the session through bankruptcy.
+    """
+    # 1-2. Step simulation and observe (pipelined); with overlap_step the
+    # step runs later, alongside the LLM call
+    if overlap_step:
+        obs_response = game.observe()
+    else:
+        _, obs_response = game.step_and_observe(ticks_per_turn)
+    observation = obs_response.get("observation", obs_response)
+    conv_mgr.last_observation = observation
+
+    # 3. Format observation
+    user_msg = format_observation(observation, state, turn)
+
+    # 4. Compute buildable area + water set from overview map on turn 1
+    if turn == 1 and not state.buildable_area_info:
+        overview = observation.get("overview_map", "")
+        if overview:
+            grid_lines = parse_overview_map(overview)
+            state.buildable_area_info = compute_buildable_area(grid_lines)
+            state.water_cells = build_water_grid(grid_lines)
+            if state.buildable_area_info:
+                log.info("Computed buildable area: %s", state.buildable_area_info)
+            log.info("Water cells mapped: %d cells", len(state.water_cells))
+
+    # 5. Send to LLM, unless the city is idling in the same state it was
+    # last left alone in, or a near-identical observation was already answered
+    turn_actions = TurnActions(game, observation.get("treasury", 0), state)
+    stream = ActionStream(lambda _, action: turn_actions.submit(action)) if stream_llm else None
+    state_sig = (
+        observation.get("treasury", 0),
+        observation.get("population", {}).get("total", 0),
+        observation.get("happiness", {}).get("overall", 0),
+        tuple(observation.get("warnings", [])),
+    )
+    response = None
+    if state_sig == conv_mgr.last_state and conv_mgr.last_idle:
+        log.info("  State unchanged since an idle turn — skipping LLM")
+        response = IDLE_RESPONSE
+    elif semantic_cache is not None:
+        response = semantic_cache.lookup(user_msg)
+        if response is not None:
+            log.info("  Observation matches an earlier turn — reusing its response")
+    cache_hit = response is not None
+    if cache_hit:
+        if overlap_step:
+            game.step(ticks_per_turn)
+    elif overlap_step:
+        messages = conv_mgr.build_messages(user_msg)
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            future = pool.submit(llm.call, messages)
+            game.step(ticks_per_turn)
+            response = future.result()
+    else:
+        messages = conv_mgr.build_messages(user_msg)
+        response = llm.call(messages, on_delta=stream and stream.feed)
+
+    # 6. Parse response
+    parsed = parse_response(response)
+
+    # 7. If query: fetch layers, send followup. Actions of the query answer
+    # still count, with or without streaming (which may have run them already)
+    query_actions: list = []
+    query_streamed: list = []
+    if "query" in parsed:
+        log.info("LLM requested query: %s", parsed["query"])
+        query_actions = parsed.get("actions", [])
+        if stream is not None:
+            query_streamed, stream = stream.actions[0], None
+        try:
+            query_response = game.send({
+                "cmd": "query",
+                "layers": parsed["query"],
+            })
+            followup_msg = (
+                format_layers(query_response)
+                + "\n\nNow respond with your actions."
+            )
+            messages = conv_mgr.build_messages(followup_msg)
+            stream = ActionStream(lambda _, action: turn_actions.submit(action)) if stream_llm else None
+            response = llm.call(messages, on_delta=stream and stream.feed)
+            parsed = parse_response(response)
+        except Exception as e:
+            log.warning("Layer query failed: %s", e)
+            parsed = {"actions": []}
+
+    if semantic_cache is not None and not cache_hit:
+        semantic_cache.add(user_msg, response)
+
+    # 7b. Generate fallback actions if LLM returned nothing
+    raw_llm_actions = query_actions + parsed.get("actions", [])
+    streamed = query_streamed + (stream.actions[0] if stream is not None else [])
+    conv_mgr.last_state = state_sig
+    conv_mgr.last_idle = not raw_llm_actions and not streamed
+    if not raw_llm_actions and not streamed:
+        fallback = generate_fallback_actions(observation, state)
+        if fallback:
+            log.info("  LLM idle — injecting %d fallback actions", len(fallback))
+            raw_llm_actions = fallback
+
+    # 7c. Auto-inject critical utilities when coverage is low (even if LLM provided actions)
+    injected = inject_critical_utilities(observation, raw_llm_actions, state)
+    if injected:
+        log.info("  Auto-injecting %d critical utilities", len(injected))
+
+    # 8. Execute actions (with normalization + budget/water/dupe pre-filtering),
+    # skipping those already executed while the answer streamed in
+    turn_actions.submit_all(unstreamed_actions(raw_llm_actions, streamed) + injected)
+    actions, results = turn_actions.actions, turn_actions.results
+    # No prefetch when bankruptcy ends the session after this turn: the
+    # step would already have run and land in the saved replay
+    if (
+        prefetch_next and not overlap_step
+        and observation.get("treasury", 0) >= BANKRUPT_TREASURY
+    ):
+        game.prefetch_step_and_observe(ticks_per_turn)
+
+    # 9. Track water failures for directional hints to LLM
+    water_fails_this_turn = [
+        r for r in results
+        if not r.get("success") and "BlockedByWater" in str(r.get("reason", ""))
+    ]
+    if water_fails_this_turn:
+        state.consecutive_water_turns += 1
+        for r in water_fails_this_turn:
+            act = r.get("action", {})
+            act_type = next(iter(act), "")
+            params = act.get(act_type)
+            coord_key = _WATER_FAIL_COORD_KEYS.get(act_type)
+            if coord_key is not None and isinstance(params, dict):
+                coords = params.get(coord_key)
+                if isinstance(coords, list) and len(coords) >= 2:
+                    state.water_fail_positions.append((coords[0], coords[1]))
+    else:
+        state.consecutive_water_turns = 0
+
+    # 10. Record turn with metrics
+    conv_mgr.record_turn(
+        turn, user_msg, response, results,
+        treasury=observation.get("treasury", 0),
+        population=observation.get("population", {}).get("total", 0),
+        building_count=observation.get("building_count", 0),
+    )
+
+    return actions, results, observation
@@ -0,0 +1,280 @@
+"""
+Pre-filter and execute one turn's actions, updating the session trackers.
+"""
+
+import logging
+
+from llm_actions import TAX_KEYS, normalize_action
+from llm_game import GameProcess
+from llm_json import json_dumps
+from llm_map import (
+    SessionState,
+    action_hits_water,
+    action_out_of_bounds,
+    record_water_failure,
+    road_line_cells,
+)
+
+log = logging.getLogger("llm_player")
+
+
+def _summarize_action(action: dict) -> str:
+    """Create a short summary string for an action."""
+    if isinstance(action, dict) and action:
+        key = next(iter(action))
+        return f"{key}({json_dumps(action[key]).decode()})"
+    return str(action)[:80]
+
+
+class _LazySummary:
+    """Log argument that runs _summarize_action only if the record is emitted."""
+
+    __slots__ = ("action",)
+
+    def __init__(self, action):
+        self.action = action
+
+    def __str__(self) -> str:
+        return _summarize_action(self.action)
+
+
+# Approximate costs for budget-aware filtering
+ACTION_COSTS = {
+    "PlaceRoadLine": 200,    # varies, but ~$10-40 per cell, ~10 cells
+    "ZoneRect": 0,           # zoning is free
+    "PlaceUtility": 600,     # PowerPlant=$1000, WaterTower=$200, avg ~$600
+    "PlaceService": 1000,    # $600-$2000
+    "BulldozeRect": 0,       # free
+    "SetTaxRates": 0,        # free
+}
+MAX_UTILITIES_PER_TURN = 4
+MAX_PER_SERVICE_TYPE = 2  # Max of any single service type per turn
+
+
+class TurnActions:
+    """Normalize, pre-filter and execute one turn's actions as they arrive.
+
+    Filtering is sequential (caps and the budget estimate depend only on
+    earlier actions), so actions can be submitted one at a time while the
+    LLM is still streaming the rest of its answer.
+    """
+
+    def __init__(self, game: GameProcess, treasury: float, state: SessionState):
+        self.game = game
+        self.treasury = treasury
+        self.state = state
+        self.actions: list[dict] = []
+        self.results: list[dict] = []
+        self.utility_count = 0
+        self.zone_count = 0
+        self.service_type_counts: dict = {}  # track service type counts this turn
+        self.spent_estimate = 0.0
+        # Rates of the last SetTaxRates admitted this turn (not yet applied)
+        self.tax_rates: tuple | None = None
+        # Throttle zoning when treasury is declining to prevent bankruptcy before first tax collection
+        treas_delta = state.last_treasury_delta
+        self.max_zones = 6  # default
+        if treas_delta < -3000 and treasury < 50000:
+            self.max_zones = 2  # slow down expansion when losing money fast
+            log.info("  Throttling zones (treasury declining $%.0f/turn, only $%.0f left)", abs(treas_delta), treasury)
+        elif treas_delta < -5000:
+            self.max_zones = 3  # moderate throttle even with high treasury
+            log.info("  Moderate zone throttle (treasury declining $%.0f/turn)", abs(treas_delta))
+
+    def submit(self, raw_action: dict):
+        """Normalize *raw_action* and execute it if it passes the filters."""
+        action = normalize_action(raw_action)
+        if self._admit(action):
+            self.actions.append(action)
+            self.results.append(self._execute(action))
+
+    def submit_all(self, raw_actions: list[dict]):
+        """Filter *raw_actions*, then execute the survivors in one batch_act.
+
+        One pipe round trip instead of one per action. If the game rejects
+        the batch as a whole (one malformed action fails the parse of the
+        entire command), the actions are retried one at a time so the valid
+        ones still run and the bad one gets its own error.
+        """
+        admitted = []
+        for raw_action in raw_actions:
+            action = normalize_action(raw_action)
+            if self._admit(action):
+                admitted.append(action)
+        if not admitted:
+            return
+        try:
+            batch = self.game.batch_act(admitted).get("results")
+        except Exception as e:
+            log.error("batch_act error: %s", e)
+            batch = None
+        if not isinstance(batch, list) or len(batch) != len(admitted):
+            for action in admitted:
+                self.actions.append(action)
+                self.results.append(self._execute(action))
+            return
+        for action, res_val in zip(admitted, batch):
+            self.actions.append(action)
+            self.results.append(self._record(action, {"result": res_val}))
+
+    def _admit(self, a: dict) -> bool:
+        if action_out_of_bounds(a):
+            log.info("  SKIP (bounds): %s", _LazySummary(a))
+            return False
+        if action_hits_water(a, self.state.water_cells):
+            log.info("  SKIP (water): %s", _LazySummary(a))
+            return False
+
+        action_type = next(iter(a), "") if isinstance(a, dict) else ""
+        params = a.get(action_type, {}) if isinstance(a, dict) else {}
+
+        # Type-specific filters: one dict lookup instead of a branch per type
+        type_filter = self._TYPE_FILTERS.get(action_type)
+        if type_filter is not None and not type_filter(self, a, params):
+            return False
+
+        # Budget check: skip expensive actions when treasury is low
+        cost = ACTION_COSTS.get(action_type, 500)
+        if cost > 0 and (self.treasury - self.spent_estimate) < cost:
+            log.info("  SKIP (budget): %s (need ~$%d, have ~$%.0f)", _LazySummary(a), cost, self.treasury - self.spent_estimate)
+            return False
+
+        self.spent_estimate += cost
+        return True
+
+    def _admit_tax_rates(self, a: dict, params: dict) -> bool:
+        # Skip redundant SetTaxRates (same rates as last time, or as one
+        # already admitted this turn); normalize_action applied the floor
+        rates = tuple([float(params.get(k, 0.09)) for k in TAX_KEYS])
+        last = self.tax_rates if self.tax_rates is not None else self.state.last_tax_rates
+        if rates == last:
+            log.debug("  SKIP (same taxes): %s", _LazySummary(a))
+            return False
+        self.tax_rates = rates
+        return True
+
+    def _unoccupied(self, action_type: str, params: dict) -> bool:
+        # Skip PlaceUtility/PlaceService at already-occupied positions
+        pos = params.get("pos")
+        if isinstance(pos, list) and len(pos) >= 2:
+            pos_key = (int(pos[0]), int(pos[1]))
+            if pos_key in self.state.placed_positions:
+                log.info("  SKIP (occupied): %s at %s", action_type, pos_key)
+                return False
+        return True
+
+    def _admit_utility(self, a: dict, params: dict) -> bool:
+        if not self._unoccupied("PlaceUtility", params):
+            return False
+        # Cap utilities per turn (except WaterTower — always allow, it's cheap and critical)
+        ut_type = params.get("utility_type", "")
+        if ut_type != "WaterTower":
+            self.utility_count += 1
+            if self.utility_count > MAX_UTILITIES_PER_TURN:
+                log.info("  SKIP (utility cap): %s", _LazySummary(a))
+                return False
+        return True
+
+    def _admit_service(self, a: dict, params: dict) -> bool:
+        if not self._unoccupied("PlaceService", params):
+            return False
+        # Cap per service type per turn (prevent 10x Cemetery spam)
+        stype = params.get("service_type", "")
+        self.service_type_counts[stype] = self.service_type_counts.get(stype, 0) + 1
+        if self.service_type_counts[stype] > MAX_PER_SERVICE_TYPE:
+            log.info("  SKIP (service cap %s=%d): %s", stype, self.service_type_counts[stype], _LazySummary(a))
+            return False
+        return True
+
+    def _admit_zone(self, a: dict, params: dict) -> bool:
+        # Throttle zone rects when treasury is declining
+        self.zone_count += 1
+        if self.zone_count > self.max_zones:
+            log.info("  SKIP (zone cap): %s", _LazySummary(a))
+            return False
+        return True
+
+    _TYPE_FILTERS = {
+        "SetTaxRates": _admit_tax_rates,
+        "PlaceUtility": _admit_utility,
+        "PlaceService": _admit_service,
+        "ZoneRect": _admit_zone,
+    }
+
+    def _execute(self, action: dict) -> dict:
+        """Send *action* to the game and record its result."""
+        try:
+            result = self.game.act(action)
+        except Exception as e:
+            return self._error(action, e)
+        return self._record(action, result)
+
+    @staticmethod
+    def _error(action: dict, e: Exception) -> dict:
+        log.error("Action error: %s", e)
+        return {
+            "action": action,
+            "result": {"error": str(e)},
+            "success": False,
+            "reason": str(e),
+            "action_summary": _summarize_action(action),
+        }
+
+    def _record(self, action: dict, result: dict) -> dict:
+        """Update the placement trackers from an action result."""
+        state = self.state
+        try:
+            res_val = result.get("result", "")
+            success = res_val == "Success"
+            reason = ""
+            act_type = next(iter(action), "") if isinstance(action, dict) else ""
+            act_params = action.get(act_type, {}) if isinstance(action, dict) else {}
+            if not success and isinstance(res_val, dict) and "Error" in res_val:
+                reason = res_val["Error"]
+                # Track runtime water failures
+                if reason == "BlockedByWater":
+                    record_water_failure(action, state.water_cells)
+                # Track AlreadyExists failures as occupied positions
+                if reason == "AlreadyExists":
+                    pos = act_params.get("pos")
+                    if isinstance(pos, list) and len(pos) >= 2:
+                        pos_key = (int(pos[0]), int(pos[1]))
+                        state.placed_positions.add(pos_key)
+                        state.available_road.discard(pos_key)
+            # Track successful placements
+            if success:
+                if act_type in ("PlaceUtility", "PlaceService"):
+                    pos = act_params.get("pos")
+                    if isinstance(pos, list) and len(pos) >= 2:
+                        pos_tuple = (int(pos[0]), int(pos[1]))
+                        state.placed_positions.add(pos_tuple)
+                        state.available_road.discard(pos_tuple)
+                        if act_type == "PlaceUtility" and act_params.get("utility_type") == "WaterTower":
+                            state.water_tower_positions.append(pos_tuple)
+                if act_type == "PlaceRoadLine":
+                    start = act_params.get("start", [])
+                    end = act_params.get("end", [])
+                    if len(start) >= 2 and len(end) >= 2:
+                        x0, y0 = int(start[0]), int(start[1])
+                        x1, y1 = int(end[0]), int(end[1])
+                        state.available_road.update(road_line_cells(x0, y0, x1, y1) - state.placed_positions)
+                        # Update next road Y for fallback expansion
+                        max_y = max(y0, y1)
+                        if max_y + 5 > state.next_road_y:
+                            state.next_road_y = max_y + 5
+                if act_type == "SetTaxRates":
+                    state.last_tax_rates = tuple([float(act_params.get(k, 0.09)) for k in TAX_KEYS])
+            summary = _summarize_action(action)
+            if success:
+                log.info("  OK: %s", summary)
+            else:
+                log.warning("  FAIL: %s -> %s", summary, reason or res_val)
+            return {
+                "action": action,
+                "result": result,
+                "success": success,
+                "reason": reason,
+                "action_summary": summary,
+            }
+        except Exception as e:
+            return self._error(action, e)
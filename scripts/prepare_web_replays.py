@@ -13,6 +13,11 @@ import json
 import math
 from pathlib import Path
 
+try:
+    import orjson  # optional: faster load/dump of large replays
+except ImportError:
+    orjson = None
+
 
 def sanitize_filename(name: str) -> str:
     return (
@@ -23,6 +28,21 @@ def sanitize_filename(name: str) -> str:
     )
 
 
+def load_replay(path: Path) -> dict:
+    if orjson is not None:
+        return orjson.loads(path.read_bytes())
+    with path.open("r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def write_replay(replay: dict, path: Path) -> None:
+    if orjson is not None:
+        path.write_bytes(orjson.dumps(replay))
+        return
+    with path.open("w", encoding="utf-8") as f:
+        json.dump(replay, f, separators=(",", ":"))
+
+
 def compress_ticks(replay: dict, target_end_tick: int) -> tuple[dict, int]:
     footer = replay.get("footer", {})
     end_tick = int(footer.get("end_tick", 0) or 0)
@@ -34,12 +54,13 @@ def compress_ticks(replay: dict, target_end_tick: int) -> tuple[dict, int]:
     entries = replay.get("entries", [])
     prev_tick = 0
     for entry in entries:
-        old_tick = int(entry.get("tick", 0))
-        new_tick = old_tick // scale
+        new_tick = entry.get("tick", 0)
+        if type(new_tick) is not int:  # ticks are ints already unless hand-edited
+            new_tick = int(new_tick)
+        new_tick //= scale
         if new_tick < prev_tick:
             new_tick = prev_tick
-        entry["tick"] = new_tick
-        prev_tick = new_tick
+        entry["tick"] = prev_tick = new_tick
 
     replay.setdefault("header", {})["start_tick"] = 0
     replay.setdefault("footer", {})["end_tick"] = prev_tick + 1
@@ -74,8 +95,7 @@ def main() -> int:
     manifest = []
     for input_path_str in args.inputs:
         input_path = Path(input_path_str)
-        with input_path.open("r", encoding="utf-8") as f:
-            replay = json.load(f)
+        replay = load_replay(input_path)
 
         original_end = int(replay.get("footer", {}).get("end_tick", 0) or 0)
         replay, scale = compress_ticks(replay, args.target_end_tick)
@@ -85,8 +105,7 @@ def main() -> int:
         out_name = f"{safe_stem}.web_x{scale}.replay"
         out_path = output_dir / out_name
 
-        with out_path.open("w", encoding="utf-8") as f:
-            json.dump(replay, f, separators=(",", ":"))
+        write_replay(replay, out_path)
 
         manifest.append(
             {